@@ -3,7 +3,8 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from .models import (
     User, Category, Product, ProductImage, ProductVariant,
-    Batch, InventoryItem, Order, OrderItem, Payment
+    Batch, InventoryItem, VariantStock, Order, OrderItem, OrderItemAllocation, Payment,
+    DailySales, DailyProductSales
 )
 
 @admin.register(User)
@@ -66,11 +67,31 @@ class PaymentAdmin(admin.ModelAdmin):
 
 @admin.register(InventoryItem)
 class InventoryItemAdmin(admin.ModelAdmin):
-    list_display = ('product_variant', 'batch', 'quantity', 'is_low_stock')
+    list_display = ('product_variant', 'batch', 'quantity', 'expired_quantity', 'is_low_stock')
     list_filter = ('batch',)
     search_fields = ('product_variant__product__name', 'batch__batch_number')
 
+@admin.register(VariantStock)
+class VariantStockAdmin(admin.ModelAdmin):
+    list_display = ('product_variant', 'on_hand', 'is_low_stock', 'earliest_batch', 'updated_at')
+    list_filter = ('is_low_stock',)
+    search_fields = ('product_variant__sku', 'product_variant__product__name')
+
+@admin.register(DailySales)
+class DailySalesAdmin(admin.ModelAdmin):
+    list_display = ('date', 'status', 'order_count', 'units', 'revenue')
+    list_filter = ('status',)
+    date_hierarchy = 'date'
+
+@admin.register(DailyProductSales)
+class DailyProductSalesAdmin(admin.ModelAdmin):
+    list_display = ('date', 'status', 'product_variant', 'line_count', 'units', 'revenue')
+    list_filter = ('status', 'category')
+    list_select_related = ('product_variant__product',)
+    date_hierarchy = 'date'
+
 # Register remaining models
 admin.site.register(ProductImage)
 admin.site.register(ProductVariant)
-admin.site.register(OrderItem)
\ No newline at end of file
+admin.site.register(OrderItem)
+admin.site.register(OrderItemAllocation)
\ No newline at end of file
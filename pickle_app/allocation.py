@@ -0,0 +1,111 @@
+# pickle_app/allocation.py
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from .models import InventoryItem, OrderItemAllocation
+from .stock import refresh_variant_stock
+
+
+def allocate_order_items(items):
+    """
+    Allocate stock for a set of order items, FIFO by batch expiry date.
+
+    The candidate inventory rows for every variant in the order are locked with
+    a single SELECT ... FOR UPDATE, allocated in memory and written back with
+    one bulk_update, all inside one transaction. Each allocation is recorded
+    in the OrderItemAllocation ledger so it can be reversed later.
+
+    Returns a tuple ``(allocations, shortages)``: ``allocations`` is a list of
+    ``(order_item, inventory_item, quantity)`` and ``shortages`` maps each
+    order item that could not be filled completely to the missing quantity.
+    """
+    items = list(items)
+    allocations = []
+    shortages = {}
+    if not items:
+        return allocations, shortages
+
+    variant_ids = {item.product_variant_id for item in items}
+    with transaction.atomic():
+        candidates = (
+            InventoryItem.objects
+            .select_for_update(of=('self',))
+            .filter(
+                product_variant_id__in=variant_ids,
+                quantity__gt=0,
+                batch__expiry_date__gte=timezone.localdate(),
+            )
+            .order_by('product_variant_id', 'batch__expiry_date', 'id')
+        )
+        stock = defaultdict(list)
+        for inv_item in candidates:
+            stock[inv_item.product_variant_id].append(inv_item)
+
+        touched = {}
+        for item in items:
+            quantity_to_fulfill = item.quantity
+            for inv_item in stock[item.product_variant_id]:
+                if quantity_to_fulfill <= 0:
+                    break
+                if inv_item.quantity <= 0:
+                    continue
+
+                taken = min(inv_item.quantity, quantity_to_fulfill)
+                inv_item.quantity -= taken
+                quantity_to_fulfill -= taken
+                touched[inv_item.pk] = inv_item
+                allocations.append((item, inv_item, taken))
+
+            if quantity_to_fulfill > 0:
+                shortages[item] = quantity_to_fulfill
+
+        if touched:
+            now = timezone.now()
+            for inv_item in touched.values():
+                inv_item.updated_at = now
+            InventoryItem.objects.bulk_update(touched.values(), ['quantity', 'updated_at'])
+            OrderItemAllocation.objects.bulk_create([
+                OrderItemAllocation(order_item=item, inventory_item=inv_item, quantity=taken)
+                for item, inv_item, taken in allocations
+            ])
+            refresh_variant_stock(inv_item.product_variant_id for inv_item in touched.values())
+
+    return allocations, shortages
+
+
+def flag_stockouts(order, shortages):
+    """
+    Append a stock warning to the order notes for every under-filled item.
+    The caller is responsible for saving the order.
+    """
+    warnings = [f"WARNING: Insufficient stock for {item.product_variant}." for item in shortages]
+    if warnings:
+        order.notes = "\n".join(filter(None, [order.notes] + warnings))
+
+
+def release_order_stock(order):
+    """
+    Return every unit allocated to the order to the inventory rows it was
+    taken from, using one set-based UPDATE, and clear the order's ledger.
+    """
+    allocations = OrderItemAllocation.objects.filter(order_item__order=order)
+    returned = (
+        allocations
+        .filter(inventory_item=OuterRef('pk'))
+        .values('inventory_item')
+        .annotate(total=Sum('quantity'))
+        .values('total')
+    )
+    with transaction.atomic():
+        variant_ids = set(allocations.values_list('inventory_item__product_variant_id', flat=True))
+        InventoryItem.objects.filter(
+            pk__in=allocations.values('inventory_item')
+        ).update(
+            quantity=F('quantity') + Subquery(returned),
+            updated_at=timezone.now(),
+        )
+        allocations.delete()
+        refresh_variant_stock(variant_ids)
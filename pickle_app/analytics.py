@@ -0,0 +1,183 @@
+# pickle_app/analytics.py
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import DailyProductSales, DailySales, Order, OrderItem, RollupCheckpoint
+from .utils import start_of_day
+
+SALES_CHECKPOINT = 'sales'
+# Re-read orders saved shortly before the last run, in case their
+# transactions committed after it finished
+SALES_ROLLUP_OVERLAP = datetime.timedelta(minutes=5)
+SALES_ROLLUP_BATCH_DAYS = 31
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+LINE_TOTAL = ExpressionWrapper(F('price') * F('quantity'), output_field=MONEY)
+
+# group_by -> (rollup table, grouping fields, extra labelled columns)
+SALES_GROUPS = {
+    'day': (DailySales, ['date'], {}),
+    'status': (DailySales, ['status'], {}),
+    'category': (DailyProductSales, ['category_id'], {
+        'category_name': F('category__name'),
+    }),
+    'product': (DailyProductSales, ['product_id'], {
+        'product_name': F('product__name'),
+    }),
+    'variant': (DailyProductSales, ['product_variant_id'], {
+        'sku': F('product_variant__sku'),
+        'variant_size': F('product_variant__size'),
+        'product_name': F('product__name'),
+    }),
+}
+
+
+def refresh_sales_rollups(days=None):
+    """
+    Bring DailySales and DailyProductSales up to date.
+
+    Only the days of orders saved since the last run are recomputed, so a
+    run costs a few small aggregates. The first run, with no checkpoint
+    yet, builds the full history. Concurrent runs are skipped rather than
+    queued; the next one picks up where the checkpoint stands.
+
+    Pass ``days`` to recompute specific dates (e.g. after orders were
+    deleted). That leaves the checkpoint alone and runs even while another
+    refresh does, since recomputing a day is idempotent. Two refreshes
+    writing the same day at once fail with IntegrityError on the rollups'
+    unique keys, and the task retries.
+    """
+    started = timezone.now()
+    with transaction.atomic():
+        if days is None:
+            RollupCheckpoint.objects.get_or_create(name=SALES_CHECKPOINT)
+            checkpoint = RollupCheckpoint.objects.select_for_update(skip_locked=True).filter(
+                name=SALES_CHECKPOINT
+            ).first()
+            if checkpoint is None:
+                return 0
+
+            orders = Order.objects.all()
+            if checkpoint.updated_through:
+                orders = orders.filter(updated_at__gte=checkpoint.updated_through - SALES_ROLLUP_OVERLAP)
+            days = orders.annotate(day=TruncDate('created_at')).values_list('day', flat=True).distinct()
+            checkpoint.updated_through = started
+            checkpoint.save(update_fields=['updated_through'])
+
+        days = sorted(set(days))
+        for i in range(0, len(days), SALES_ROLLUP_BATCH_DAYS):
+            rebuild_sales_days(days[i:i + SALES_ROLLUP_BATCH_DAYS])
+    return len(days)
+
+
+def rebuild_sales_days(days):
+    """
+    Replace the rollup rows for ``days`` with fresh aggregates: one query
+    over the orders and one over their lines.
+    """
+    created_range = {
+        'created_at__gte': start_of_day(days[0]),
+        'created_at__lt': start_of_day(days[-1] + datetime.timedelta(days=1)),
+    }
+    orders = (
+        Order.objects.filter(**created_range)
+        .annotate(day=TruncDate('created_at'))
+        .filter(day__in=days)
+        .values('day', 'status')
+        .annotate(order_count=Count('id'), revenue=Sum('total'))
+        .order_by()
+    )
+    lines = (
+        OrderItem.objects.filter(**{f'order__{lookup}': value for lookup, value in created_range.items()})
+        .annotate(day=TruncDate('order__created_at'))
+        .filter(day__in=days)
+        .values(
+            'day', 'product_variant_id',
+            status=F('order__status'),
+            product_id=F('product_variant__product_id'),
+            category_id=F('product_variant__product__category_id'),
+        )
+        .annotate(line_count=Count('id'), units=Sum('quantity'), revenue=Sum(LINE_TOTAL))
+        .order_by()
+    )
+
+    product_sales = []
+    units = defaultdict(int)
+    for row in lines:
+        units[row['day'], row['status']] += row['units']
+        product_sales.append(DailyProductSales(
+            date=row['day'],
+            status=row['status'],
+            product_variant_id=row['product_variant_id'],
+            product_id=row['product_id'],
+            category_id=row['category_id'],
+            line_count=row['line_count'],
+            units=row['units'],
+            revenue=row['revenue'],
+        ))
+    sales = [
+        DailySales(
+            date=row['day'],
+            status=row['status'],
+            order_count=row['order_count'],
+            units=units[row['day'], row['status']],
+            revenue=row['revenue'],
+        )
+        for row in orders
+    ]
+
+    DailySales.objects.filter(date__in=days).delete()
+    DailyProductSales.objects.filter(date__in=days).delete()
+    DailySales.objects.bulk_create(sales)
+    DailyProductSales.objects.bulk_create(product_sales)
+
+
+def rollup_rows(model, date_from, date_to, statuses=None):
+    queryset = model.objects.filter(date__gte=date_from, date__lte=date_to)
+    if statuses:
+        queryset = queryset.filter(status__in=statuses)
+    return queryset
+
+
+def sales_report(group_by, date_from, date_to, statuses=None):
+    """
+    Rolled-up sales between two dates (inclusive) per ``group_by``, which
+    must be one of SALES_GROUPS.
+    """
+    model, fields, columns = SALES_GROUPS[group_by]
+    queryset = rollup_rows(model, date_from, date_to, statuses)
+
+    key = fields[0]
+    metrics = {'units': Sum('units'), 'revenue': Sum('revenue')}
+    if model is DailySales:
+        metrics['order_count'] = Sum('order_count')
+        ordering = [key]
+    else:
+        # Order lines, not distinct orders: an order can hold several variants
+        metrics['line_count'] = Sum('line_count')
+        ordering = ['-revenue', key]
+    return queryset.values(*fields, **columns).annotate(**metrics).order_by(*ordering)
+
+
+def sales_totals(date_from, date_to, statuses=None):
+    totals = rollup_rows(DailySales, date_from, date_to, statuses).aggregate(
+        order_count=Coalesce(Sum('order_count'), 0),
+        units=Coalesce(Sum('units'), 0),
+        revenue=Coalesce(Sum('revenue'), Decimal('0.00'), output_field=MONEY),
+    )
+    return with_average_order_value([totals])[0]
+
+
+def with_average_order_value(rows):
+    for row in rows:
+        count = row.get('order_count')
+        row['average_order_value'] = (
+            (row['revenue'] / count).quantize(Decimal('0.01')) if count else None
+        )
+    return rows
@@ -0,0 +1,212 @@
+# pickle_app/async_views.py
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.paginator import InvalidPage
+from django.http import Http404
+from rest_framework import status
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .cache import (
+    CatalogCacheMixin, ConditionalGetMixin,
+    acatalog_cache_key, acatalog_last_modified, aget_catalog_version, etag_matches, make_etag, set_validators
+)
+from .views import HomeView, CategoryViewSet, ProductViewSet, SearchView
+
+
+def async_get(sync_view, async_handler):
+    """
+    Serve JSON GET requests from ``async_handler`` on the event loop and hand
+    everything else (writes, the browsable API) to the existing sync view.
+    """
+    sync_handler = sync_to_async(sync_view)
+
+    async def view(request, *args, **kwargs):
+        if (
+            request.method == 'GET'
+            and 'text/html' not in request.headers.get('Accept', '')
+            and api_settings.URL_FORMAT_OVERRIDE not in request.GET
+        ):
+            return await async_handler(request, *args, **kwargs)
+        return await sync_handler(request, *args, **kwargs)
+
+    view.csrf_exempt = True
+    return view
+
+
+def setup_view(view_class, request, kwargs, actions=None):
+    """
+    Build a DRF view instance the way as_view() and dispatch() do up to the
+    handler call, so its queryset, filters, serializer and pagination
+    settings can be reused outside the sync request cycle. Viewsets need the
+    ``actions`` of their route.
+    """
+    view = view_class()
+    if actions is not None:
+        view.action_map = {'head': actions['get'], **actions}
+        for method, action in view.action_map.items():
+            setattr(view, method, getattr(view, action))
+    view.setup(request, **kwargs)
+    view.request = view.initialize_request(request, **kwargs)
+    view.headers = view.default_response_headers
+    view.format_kwarg = None  # Set by initial()
+    return view
+
+
+async def dispatch(view, handler):
+    """
+    APIView.dispatch() around the async ``handler``: run the view's
+    authentication, permission and throttle checks, turn exceptions into
+    error responses and finalize and render the response.
+    """
+    try:
+        await sync_to_async(view.initial)(view.request)
+        response = await handler()
+    except Exception as exc:
+        response = view.handle_exception(exc)
+    return view.finalize_response(view.request, response).render()
+
+
+async def conditional_response(view, queryset, handler):
+    """ConditionalGetMixin.conditional_response() around the async ``handler``."""
+    if not isinstance(view, ConditionalGetMixin):
+        return await handler()
+
+    version = await aget_catalog_version()
+    etag = make_etag(view.request, version)
+    if etag_matches(view.request, etag):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = await handler()
+
+    last_modified = await acatalog_last_modified(view.request, version, queryset, view.last_modified_fields)
+    set_validators(response, etag, last_modified)
+    return response
+
+
+async def cached_response(view, handler):
+    """CatalogCacheMixin.cached_response() around the async ``handler``, which returns data."""
+    if not isinstance(view, CatalogCacheMixin):
+        return Response(await handler())
+
+    key = await acatalog_cache_key(view.request)
+    data = await cache.aget(key)
+    if data is None:
+        data = await handler()
+        await cache.aset(key, data, view.catalog_cache_timeout)
+    return Response(data)
+
+
+async def paginate(view, queryset, represent, rows=None):
+    """
+    PageNumberPagination.paginate_queryset() and get_paginated_response()
+    with the count and the page read through the async ORM. The page is
+    read from ``rows`` (by default ``queryset``, which is what gets
+    counted) and serialized by ``represent``.
+    """
+    paginator = view.paginator
+    request = view.request
+    rows = queryset if rows is None else rows
+    page_size = paginator.get_page_size(request)
+    if not page_size:
+        return represent([obj async for obj in rows])
+
+    django_paginator = paginator.django_paginator_class(rows, page_size)
+    django_paginator.count = await queryset.acount()
+    page_number = paginator.get_page_number(request, django_paginator)
+    try:
+        # Slicing is lazy, so this only validates the page number
+        page = django_paginator.page(page_number)
+    except InvalidPage as exc:
+        raise NotFound(paginator.invalid_page_message.format(page_number=page_number, message=str(exc)))
+    page.object_list = [obj async for obj in page.object_list]
+
+    paginator.page = page
+    paginator.request = request
+    return paginator.get_paginated_response(represent(page.object_list)).data
+
+
+async def aget_object(view):
+    """GenericAPIView.get_object() through the async ORM."""
+    queryset = await sync_to_async(view.filter_queryset)(view.get_queryset())
+    lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+    try:
+        obj = await queryset.aget(**{view.lookup_field: view.kwargs[lookup_url_kwarg]})
+    except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+        raise Http404
+    await sync_to_async(view.check_object_permissions)(view.request, obj)
+    return obj
+
+
+def catalog_list(view_class, actions=None):
+    if view_class.pagination_class and not issubclass(view_class.pagination_class, PageNumberPagination):
+        raise ImproperlyConfigured(
+            f"{view_class.__name__}: the async read path only supports PageNumberPagination."
+        )
+
+    async def handler(request, **kwargs):
+        view = setup_view(view_class, request, kwargs, actions)
+
+        async def data(queryset):
+            # Views with ValuesListMixin may serve values_list() rows instead
+            plan = view.get_values_plan() if hasattr(view, 'get_values_plan') else None
+            if plan is None:
+                rows = queryset
+                represent = lambda objects: view.get_serializer(objects, many=True).data
+            else:
+                rows = plan.values(queryset)
+                represent = plan.represent
+
+            if view.paginator is None:
+                return represent([obj async for obj in rows])
+            return await paginate(view, queryset, represent, rows)
+
+        async def list_response():
+            queryset = await sync_to_async(view.filter_queryset)(view.get_queryset())
+            return await conditional_response(
+                view, queryset, lambda: cached_response(view, lambda: data(queryset))
+            )
+
+        return await dispatch(view, list_response)
+
+    return handler
+
+
+def catalog_retrieve(view_class, actions):
+    async def handler(request, **kwargs):
+        view = setup_view(view_class, request, kwargs, actions)
+
+        async def data():
+            return view.get_serializer(await aget_object(view)).data
+
+        async def retrieve_response():
+            lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+            queryset = view.get_queryset().filter(**{view.lookup_field: kwargs[lookup_url_kwarg]})
+            return await conditional_response(view, queryset, lambda: cached_response(view, data))
+
+        return await dispatch(view, retrieve_response)
+
+    return handler
+
+
+async def home(request):
+    view = setup_view(HomeView, request, {})
+
+    async def get():
+        return view.get(view.request)
+
+    return await dispatch(view, get)
+
+
+LIST_ACTIONS = {'get': 'list', 'post': 'create'}
+DETAIL_ACTIONS = {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}
+
+home_view = async_get(HomeView.as_view(), home)
+category_list = async_get(CategoryViewSet.as_view(LIST_ACTIONS), catalog_list(CategoryViewSet, LIST_ACTIONS))
+category_detail = async_get(CategoryViewSet.as_view(DETAIL_ACTIONS), catalog_retrieve(CategoryViewSet, DETAIL_ACTIONS))
+product_list = async_get(ProductViewSet.as_view(LIST_ACTIONS), catalog_list(ProductViewSet, LIST_ACTIONS))
+product_detail = async_get(ProductViewSet.as_view(DETAIL_ACTIONS), catalog_retrieve(ProductViewSet, DETAIL_ACTIONS))
+search_view = async_get(SearchView.as_view(), catalog_list(SearchView))
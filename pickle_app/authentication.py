@@ -0,0 +1,123 @@
+# pickle_app/authentication.py
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.contrib.auth import get_user_model
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+ROLE_CLAIM = 'role'
+USER_CACHE_SIZE = 1024
+USER_CACHE_TTL = 60
+
+User = get_user_model()
+
+
+class UserCache:
+    """
+    Thread-safe, in-process LRU of user rows whose entries expire after
+    ``ttl`` seconds. Each process keeps its own copy, so the TTL bounds how
+    long another worker can serve a row that has since changed.
+    """
+    def __init__(self, maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires, user = entry
+            if expires < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return user
+
+    def set(self, user_id, user):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache()
+
+
+def load_user(user_id):
+    """
+    Return the active user row for ``user_id`` (or None) through the cache.
+    Callers get their own copy, so changes to it never leak into the cache.
+    """
+    user = user_cache.get(user_id)
+    if user is None:
+        user = User.objects.filter(pk=user_id, is_active=True).first()
+        if user is None:
+            return None
+        user_cache.set(user_id, user)
+    return copy.copy(user)
+
+
+def get_full_user(request, fresh=False):
+    """
+    The full ``User`` row behind ``request.user``. Pass ``fresh=True`` on
+    write paths so updates never start from a cached copy.
+    """
+    user = request.user
+    if isinstance(user, User):
+        return user
+    if fresh:
+        return User.objects.get(pk=user.id, is_active=True)
+    full_user = load_user(user.id)
+    if full_user is None:
+        raise User.DoesNotExist
+    return full_user
+
+
+class ClaimsUser(TokenUser):
+    """
+    Request user built from access token claims. ``id`` and ``role`` are
+    all permissions and queryset scoping need; anything else comes from
+    the cached row.
+    """
+    @cached_property
+    def role(self):
+        role = self.token.get(ROLE_CLAIM)
+        if role is None:
+            # Tokens issued before the role claim existed
+            user = load_user(self.id)
+            role = user.role if user else None
+        return role
+
+    def __str__(self):
+        return f"ClaimsUser {self.id}"
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that trusts the signed claims instead of loading the
+    user row on every request.
+
+    Role changes and deactivations reach access tokens on the next refresh,
+    so they take effect within ``ACCESS_TOKEN_LIFETIME``.
+    """
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+        return ClaimsUser(validated_token)
@@ -0,0 +1,99 @@
+# pickle_app/bulk.py
+import io
+
+from django.db import connections, router
+from django.db.models import AutoField
+
+
+def upsert(model, objs, unique_fields, update_fields):
+    """
+    Insert ``objs`` or update the rows they collide with on ``unique_fields``
+    and return ``{key: pk}`` for every row written, where ``key`` is the
+    unique field value (a tuple for composite keys).
+
+    PostgreSQL streams the rows through ``COPY`` into a staging table and
+    upserts from there in one statement. Other databases use
+    ``bulk_create(update_conflicts=True)`` followed by one lookup query.
+    Later objects win when several share a key. Like bulk_create, this
+    bypasses save() and model signals.
+    """
+    opts = model._meta
+    unique = [opts.get_field(name) for name in unique_fields]
+
+    def key(obj):
+        values = tuple(getattr(obj, field.attname) for field in unique)
+        return values if len(values) > 1 else values[0]
+
+    objs = list({key(obj): obj for obj in objs}.values())
+    if not objs:
+        return {}
+
+    using = router.db_for_write(model)
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        return _copy_upsert(connection, model, objs, unique, update_fields, key)
+
+    model._base_manager.using(using).bulk_create(
+        objs, update_conflicts=True, unique_fields=unique_fields, update_fields=update_fields
+    )
+    keys = {key(obj) for obj in objs}
+    first = unique[0].attname
+    rows = model._base_manager.using(using).filter(
+        **{f'{first}__in': {getattr(obj, first) for obj in objs}}
+    ).values_list(*[field.attname for field in unique], 'pk')
+    ids = {}
+    for *values, pk in rows:
+        row_key = tuple(values) if len(values) > 1 else values[0]
+        if row_key in keys:
+            ids[row_key] = pk
+    return ids
+
+
+def _copy_upsert(connection, model, objs, unique, update_fields, key):
+    opts = model._meta
+    qn = connection.ops.quote_name
+    fields = [field for field in opts.concrete_fields if not isinstance(field, AutoField)]
+    columns = ', '.join(qn(field.column) for field in fields)
+    table = qn(opts.db_table)
+    staging = qn(f'import_{opts.db_table}')
+    conflict = ', '.join(qn(field.column) for field in unique)
+    updates = ', '.join(
+        f'{qn(column)} = EXCLUDED.{qn(column)}'
+        for column in (opts.get_field(name).column for name in update_fields)
+    )
+    returning = ', '.join([qn(field.column) for field in unique] + [qn(opts.pk.column)])
+
+    buffer = io.StringIO()
+    for obj in objs:
+        buffer.write('\t'.join(
+            _copy_value(field.get_db_prep_save(field.pre_save(obj, True), connection))
+            for field in fields
+        ))
+        buffer.write('\n')
+    buffer.seek(0)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {staging}')
+        cursor.execute(f'CREATE TEMP TABLE {staging} AS SELECT {columns} FROM {table} WITH NO DATA')
+        cursor.copy_expert(f'COPY {staging} ({columns}) FROM STDIN', buffer)
+        cursor.execute(
+            f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging} '
+            f'ON CONFLICT ({conflict}) DO UPDATE SET {updates} RETURNING {returning}'
+        )
+        rows = cursor.fetchall()
+        cursor.execute(f'DROP TABLE {staging}')
+
+    ids = {}
+    for *values, pk in rows:
+        ids[tuple(values) if len(values) > 1 else values[0]] = pk
+    return ids
+
+
+def _copy_value(value):
+    # COPY text format: \N is NULL; backslash, tab and newlines are escaped
+    if value is None:
+        return '\\N'
+    return (
+        str(value).replace('\\', '\\\\').replace('\t', '\\t')
+        .replace('\n', '\\n').replace('\r', '\\r')
+    )
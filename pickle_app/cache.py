@@ -0,0 +1,175 @@
+# pickle_app/cache.py
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db.models import Max
+from django.utils.http import http_date, parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+CATALOG_VERSION_KEY = 'catalog:version'
+CATALOG_CACHE_TIMEOUT = 60 * 15
+
+
+def get_catalog_version():
+    """
+    Return the current catalog version, initialising it if the cache was
+    flushed. A time-based seed keeps old entries from being picked up again.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+async def aget_catalog_version():
+    version = await cache.aget(CATALOG_VERSION_KEY)
+    if version is None:
+        await cache.aadd(CATALOG_VERSION_KEY, time.time_ns(), None)
+        version = await cache.aget(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """
+    Invalidate every cached catalog response by moving to a new version.
+    """
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOG_VERSION_KEY, time.time_ns(), None)
+
+
+def normalized_request_url(request):
+    """
+    Host, path and sorted non-empty query parameters of the request.
+    """
+    params = sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        for value in values
+        if value != ''
+    )
+    return f"{request.get_host()}{request.path}?{params}"
+
+
+def catalog_cache_key(request):
+    """
+    Build a cache key from the normalized request URL and catalog version.
+    """
+    return _catalog_cache_key(request, get_catalog_version())
+
+
+async def acatalog_cache_key(request):
+    return _catalog_cache_key(request, await aget_catalog_version())
+
+
+def _catalog_cache_key(request, version):
+    digest = hashlib.md5(normalized_request_url(request).encode()).hexdigest()
+    return f"catalog:{version}:{digest}"
+
+
+class CatalogCacheMixin:
+    """
+    Cache the serialized payloads of list and retrieve actions.
+
+    Entries are keyed on the catalog version, so any change to the catalog
+    (see signals.py) invalidates all of them at once.
+    """
+    catalog_cache_timeout = CATALOG_CACHE_TIMEOUT
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        key = catalog_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, self.catalog_cache_timeout)
+        return response
+
+
+class ConditionalGetMixin:
+    """
+    Answer list and retrieve requests with ``304 Not Modified`` when the
+    client's ``If-None-Match`` still matches.
+
+    The ETag is built from the normalized URL and the catalog version, so
+    any catalog change (a category rename included) invalidates it and a
+    match costs no query at all. ``Last-Modified`` is the latest of
+    ``last_modified_fields`` over the filtered queryset, aggregated once
+    per catalog version and cached.
+    """
+    last_modified_fields = ('updated_at',)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, self.filter_queryset(self.get_queryset()), request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.get_queryset().filter(**{self.lookup_field: kwargs[lookup_url_kwarg]})
+        return self.conditional_response(super().retrieve, queryset, request, *args, **kwargs)
+
+    def conditional_response(self, handler, queryset, request, *args, **kwargs):
+        version = get_catalog_version()
+        etag = make_etag(request, version)
+        if etag_matches(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+
+        last_modified = catalog_last_modified(request, version, queryset, self.last_modified_fields)
+        set_validators(response, etag, last_modified)
+        return response
+
+
+def make_etag(request, version):
+    raw = f"{normalized_request_url(request)}:{version}"
+    return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+
+def catalog_last_modified(request, version, queryset, fields):
+    key = f"{_catalog_cache_key(request, version)}:last-modified"
+    cached = cache.get(key)
+    if cached is None:
+        cached = (_latest(queryset.order_by().aggregate(*[Max(field) for field in fields])),)
+        cache.set(key, cached, CATALOG_CACHE_TIMEOUT)
+    return cached[0]
+
+
+async def acatalog_last_modified(request, version, queryset, fields):
+    key = f"{_catalog_cache_key(request, version)}:last-modified"
+    cached = await cache.aget(key)
+    if cached is None:
+        cached = (_latest(await queryset.order_by().aaggregate(*[Max(field) for field in fields])),)
+        await cache.aset(key, cached, CATALOG_CACHE_TIMEOUT)
+    return cached[0]
+
+
+def _latest(aggregates):
+    # Wrapped in a tuple by the callers so "no rows" (None) can be cached
+    return max(filter(None, aggregates.values()), default=None)
+
+
+def etag_matches(request, etag):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    return bool(if_none_match) and (etag in parse_etags(if_none_match) or if_none_match.strip() == '*')
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
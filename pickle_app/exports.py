@@ -0,0 +1,236 @@
+# pickle_app/exports.py
+import csv
+import datetime
+import io
+import json
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import DateField, DecimalField, ExpressionWrapper, F
+from django.db.models.constants import LOOKUP_SEP
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
+from django_filters import rest_framework as django_filters
+from rest_framework import generics
+
+from .models import Order, OrderItem, Payment
+from .permissions import IsStaffUser
+from .utils import start_of_day
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+class DateRangeFilterSet(django_filters.FilterSet):
+    """
+    ``date_from``/``date_to`` (inclusive, in the site time zone) turned into
+    a half-open range on ``date_field`` so the created_at indexes apply.
+    """
+    date_field = 'created_at'
+    date_from = django_filters.DateFilter(method='filter_date_from')
+    date_to = django_filters.DateFilter(method='filter_date_to')
+
+    def filter_date_from(self, queryset, name, value):
+        return queryset.filter(**{f'{self.date_field}__gte': start_of_day(value)})
+
+    def filter_date_to(self, queryset, name, value):
+        return queryset.filter(**{f'{self.date_field}__lt': start_of_day(value + datetime.timedelta(days=1))})
+
+
+class OrderExportFilter(DateRangeFilterSet):
+    status = django_filters.MultipleChoiceFilter(choices=Order.STATUS_CHOICES)
+
+    class Meta:
+        model = Order
+        fields = ['status']
+
+
+class OrderItemExportFilter(DateRangeFilterSet):
+    date_field = 'order__created_at'
+    status = django_filters.MultipleChoiceFilter(field_name='order__status', choices=Order.STATUS_CHOICES)
+
+    class Meta:
+        model = OrderItem
+        fields = ['status']
+
+
+class PaymentExportFilter(DateRangeFilterSet):
+    status = django_filters.MultipleChoiceFilter(choices=Payment.STATUS_CHOICES)
+    payment_method = django_filters.MultipleChoiceFilter(choices=Payment.PAYMENT_METHOD_CHOICES)
+
+    class Meta:
+        model = Payment
+        fields = ['status', 'payment_method']
+
+
+def csv_chunks(columns, rows, rows_per_chunk=500):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % rows_per_chunk == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def jsonl_chunks(columns, rows, rows_per_chunk=500):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder))
+        if len(lines) == rows_per_chunk:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+RENDERERS = {'csv': csv_chunks, 'jsonl': jsonl_chunks}
+
+
+def column_field(queryset, lookup):
+    """
+    The model field (or annotation output field) behind a values() lookup.
+    """
+    if lookup in queryset.query.annotations:
+        return queryset.query.annotations[lookup].output_field
+    model = queryset.model
+    *path, name = lookup.split(LOOKUP_SEP)
+    for part in path:
+        model = model._meta.get_field(part).related_model
+    return model._meta.get_field(name)
+
+
+def column_converter(field):
+    """
+    How values of ``field`` are written, the same in every format: decimals
+    at the field's scale and dates and datetimes as ISO 8601 strings. Other
+    values are left to the renderer.
+    """
+    if isinstance(field, DecimalField):
+        exponent = Decimal(1).scaleb(-field.decimal_places)
+        return lambda value: value.quantize(exponent)
+    if isinstance(field, DateField):  # DateTimeField included
+        return DjangoJSONEncoder().default
+    return None
+
+
+def convert_rows(rows, converters):
+    for row in rows:
+        yield tuple(
+            convert(value) if convert and value is not None else value
+            for convert, value in zip(converters, row)
+        )
+
+
+async def iterate_in_thread(chunks):
+    """
+    Pull a sync generator from the request's sync thread one chunk at a time.
+    Django would otherwise read a sync streaming body into memory under ASGI.
+    """
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    while True:
+        chunk = await next_chunk(chunks, None)
+        if chunk is None:
+            break
+        yield chunk
+
+
+class ExportView(generics.GenericAPIView):
+    """
+    Stream every row matching the filters as CSV or JSON Lines.
+
+    Rows are read as tuples through a server-side cursor in chunks of
+    EXPORT_CHUNK_SIZE, so memory use does not grow with the export. Both
+    formats write each column's values the same way (see column_converter).
+    Subclasses set ``columns``: output names mapped to ORM lookups.
+    """
+    permission_classes = [IsStaffUser]
+    filter_backends = [django_filters.DjangoFilterBackend]
+    pagination_class = None
+    columns = {}
+    ordering = ('created_at', 'id')
+    export_name = None
+
+    def get(self, request, extension):
+        if extension not in RENDERERS:
+            raise Http404
+        queryset = self.filter_queryset(self.get_queryset()).order_by(*self.ordering)
+        rows = queryset.values_list(*self.columns.values()).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        converters = [column_converter(column_field(queryset, lookup)) for lookup in self.columns.values()]
+        rows = convert_rows(rows, converters)
+
+        chunks = RENDERERS[extension](list(self.columns), rows)
+        if isinstance(request._request, ASGIRequest):
+            chunks = iterate_in_thread(chunks)
+
+        response = StreamingHttpResponse(chunks, content_type=EXPORT_CONTENT_TYPES[extension])
+        filename = f"{self.export_name}-{timezone.localdate():%Y%m%d}.{extension}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class OrderExportView(ExportView):
+    queryset = Order.objects.all()
+    filterset_class = OrderExportFilter
+    export_name = 'orders'
+    columns = {
+        'id': 'id',
+        'order_number': 'order_number',
+        'created_at': 'created_at',
+        'status': 'status',
+        'user_id': 'user_id',
+        'email': 'email',
+        'phone_number': 'phone_number',
+        'subtotal': 'subtotal',
+        'shipping_cost': 'shipping_cost',
+        'tax': 'tax',
+        'total': 'total',
+        'stock_allocated_at': 'stock_allocated_at',
+    }
+
+
+class OrderItemExportView(ExportView):
+    queryset = OrderItem.objects.annotate(
+        line_total=ExpressionWrapper(F('price') * F('quantity'), output_field=DecimalField(max_digits=12, decimal_places=2))
+    )
+    filterset_class = OrderItemExportFilter
+    export_name = 'order-items'
+    ordering = ('order__created_at', 'order_id', 'id')
+    columns = {
+        'id': 'id',
+        'order_id': 'order_id',
+        'order_number': 'order__order_number',
+        'order_created_at': 'order__created_at',
+        'order_status': 'order__status',
+        'variant_id': 'product_variant_id',
+        'sku': 'product_variant__sku',
+        'product': 'product_variant__product__name',
+        'size': 'product_variant__size',
+        'quantity': 'quantity',
+        'price': 'price',
+        'line_total': 'line_total',
+    }
+
+
+class PaymentExportView(ExportView):
+    queryset = Payment.objects.all()
+    filterset_class = PaymentExportFilter
+    export_name = 'payments'
+    columns = {
+        'id': 'id',
+        'order_id': 'order_id',
+        'order_number': 'order__order_number',
+        'created_at': 'created_at',
+        'amount': 'amount',
+        'payment_method': 'payment_method',
+        'transaction_id': 'transaction_id',
+        'status': 'status',
+    }
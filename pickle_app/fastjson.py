@@ -0,0 +1,94 @@
+# pickle_app/fastjson.py
+import codecs
+import io
+import math
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Dates and times go through DRF's encoder so they keep its format
+# (milliseconds, 'Z' for UTC); dataclasses stay unsupported, as in DRF
+ORJSON_OPTIONS = (
+    orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS if orjson else 0
+)
+# orjson parses integers outside 64 bits as floats, so bodies with a run
+# of 19 digits anywhere, even inside a string, go to the stdlib parser.
+# Mapping every digit to '0' and searching for the run beats a regex scan.
+DIGITS_TO_ZERO = bytes.maketrans(b'123456789', b'000000000')
+LONG_NUMBER = b'0' * 19
+
+
+def finite(default):
+    """
+    Wrap an encoder's ``default`` to reject the NaN or infinite floats it
+    makes from Decimals, which orjson would write as null.
+    """
+    def encode(obj):
+        value = default(obj)
+        if isinstance(value, float) and not math.isfinite(value):
+            raise ValueError(f"Out of range float values are not JSON compliant: {obj!r}")
+        return value
+    return encode
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer backed by orjson when it is installed.
+
+    The output is the same as the stdlib renderer's: compact, UTF-8, with
+    \\u2028 and \\u2029 escaped, and Decimal, datetime, lazy strings etc.
+    encoded by DRF's JSONEncoder.
+
+    Indented output (the browsable API, ``Accept: ...; indent=4``),
+    ``ensure_ascii`` and anything orjson cannot encode, such as integers
+    over 64 bits, non-string keys or a NaN or infinite Decimal, use the
+    stdlib renderer.
+
+    Native floats differ: large or small ones are written without the '+'
+    or leading zero in their exponent (1e16, not 1e+16), and NaN or
+    infinity renders as null where the stdlib renderer fails. No serializer
+    in this API outputs floats, and spotting them would take a walk over
+    the data that costs more than the stdlib renderer itself.
+    """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=finite(self.encoder_class().default), option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+class FastJSONParser(JSONParser):
+    """
+    JSONParser backed by orjson for UTF-8 bodies when it is installed.
+    Bodies orjson rejects are parsed again by the stdlib parser, so errors
+    keep their usual messages and what only the stdlib accepts (lone
+    surrogates, NaN when STRICT_JSON is off) still parses.
+    """
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read()
+        if LONG_NUMBER in body.translate(DIGITS_TO_ZERO):
+            return super().parse(io.BytesIO(body), media_type, parser_context)
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            return super().parse(io.BytesIO(body), media_type, parser_context)
@@ -0,0 +1,179 @@
+# pickle_app/fastpath.py
+from operator import attrgetter
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.fields import empty
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+# Fields whose to_representation() returns database values unchanged
+PASSTHROUGH_FIELDS = (serializers.CharField, serializers.IntegerField, serializers.BooleanField)
+
+
+def resolve_lookup(model, source_attrs):
+    """
+    Resolve a dotted serializer source to ``(lookup, model_field,
+    nullable_path)``, or None unless it is a chain of forward relations
+    ending in a concrete field. ``nullable_path`` is True when a relation on
+    the way may be missing.
+    """
+    opts = model._meta
+    nullable_path = False
+    for i, attr in enumerate(source_attrs):
+        try:
+            field = opts.get_field(attr)
+        except FieldDoesNotExist:
+            return None
+        if not field.concrete or field.many_to_many:
+            return None
+        if i < len(source_attrs) - 1:
+            if not field.is_relation:
+                return None
+            nullable_path = nullable_path or field.null
+            opts = field.related_model._meta
+    return '__'.join(source_attrs), field, nullable_path
+
+
+def column_getter(field, lookup, default=None):
+    """
+    Read ``lookup`` off a row and format it like ``field`` would; None
+    becomes ``default``.
+    """
+    passthrough = isinstance(field, serializers.RelatedField) or isinstance(field, PASSTHROUGH_FIELDS)
+    getter = attrgetter(lookup)
+    if passthrough and default is None:
+        return getter
+    to_representation = (lambda value: value) if passthrough else field.to_representation
+
+    def get(row):
+        value = getter(row)
+        return default if value is None else to_representation(value)
+    return get
+
+
+def method_getter(method, lookups):
+    getters = [attrgetter(lookup) for lookup in lookups]
+    return lambda row: method(*[get(row) for get in getters])
+
+
+def values_plan(serializer):
+    """
+    Build a ValuesPlan for the serializer's current fields, or return None
+    if any of them cannot be read from ``values_list()`` rows.
+
+    Plain and primary-key fields are mapped to their ORM lookups. Nested
+    serializers, method fields, files and model properties are supported
+    only through ``Meta.values_fields`` (name -> lookups) and a matching
+    ``value_<name>(*values)`` method on the serializer.
+    """
+    model = serializer.Meta.model
+    custom = getattr(serializer.Meta, 'values_fields', {})
+    columns = []
+    lookups = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if name in custom:
+            columns.append((name, method_getter(getattr(serializer, f'value_{name}'), custom[name])))
+            lookups.extend(custom[name])
+            continue
+        if isinstance(field, (serializers.BaseSerializer, serializers.SerializerMethodField, serializers.FileField)):
+            return None
+        if isinstance(field, serializers.RelatedField) and not (
+            isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None
+        ):
+            return None
+        resolved = resolve_lookup(model, field.source_attrs)
+        if resolved is None:
+            return None
+        lookup, model_field, nullable_path = resolved
+        default = None
+        if nullable_path:
+            # DRF uses the default, or omits the field, when a relation is
+            # missing, but renders None for a null column; rows can't tell
+            # these apart unless the column itself is never null
+            if field.default is empty or model_field.null:
+                return None
+            default = field.default
+        columns.append((name, column_getter(field, lookup, default)))
+        lookups.append(lookup)
+    return ValuesPlan(columns, lookups)
+
+
+class ValuesPlan:
+    """
+    Renders rows in the same shape as the serializer it was built from,
+    without creating model instances or resolving attributes field by field.
+
+    Rows are named tuples from ``values_list(named=True)``, with one
+    attribute per lookup (``pk``, ``category__name``), so code that reads
+    ordering values off model instances, like KeysetPagination, reads them
+    off rows as well.
+    """
+    def __init__(self, columns, lookups):
+        self.columns = columns
+        self.lookups = lookups
+
+    def values(self, queryset, extra=()):
+        lookups = dict.fromkeys([*self.lookups, *extra])
+        return queryset.prefetch_related(None).values_list(*lookups, named=True)
+
+    def represent(self, rows):
+        columns = self.columns
+        return [{name: get(row) for name, get in columns} for row in rows]
+
+
+class CountedRows:
+    """
+    ValuesPlan rows for Django's Paginator, counted on the model queryset:
+    a count over the values_list() query would keep its joins.
+    """
+    def __init__(self, queryset, rows):
+        self.queryset = queryset
+        self.rows = rows
+        self.ordered = rows.ordered
+
+    def count(self):
+        return self.queryset.count()
+
+    def __getitem__(self, key):
+        return self.rows[key]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+class ValuesListMixin:
+    """
+    Serve the list action from ``values_list()`` rows through a ValuesPlan when
+    the selected fields allow it, falling back to the serializer otherwise.
+    The JSON is the same either way; set ``use_values_list = False`` to
+    turn the fast path off (see the check_fast_lists command).
+    """
+    use_values_list = True
+
+    def get_values_plan(self):
+        if not self.use_values_list or self.request.method not in SAFE_METHODS:
+            return None
+        return values_plan(self.get_serializer())
+
+    def get_rows(self, plan, queryset):
+        paginator = self.paginator
+        if hasattr(paginator, 'get_ordering'):
+            # Cursor paginators read the ordering value and pk off each row
+            ordering = paginator.get_ordering(self.request, queryset, self)
+            return plan.values(queryset, ['pk', *(field.lstrip('-') for field in ordering)])
+        return CountedRows(queryset, plan.values(queryset))
+
+    def list(self, request, *args, **kwargs):
+        plan = self.get_values_plan()
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = self.get_rows(plan, queryset)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(plan.represent(page))
+        return Response(plan.represent(rows))
@@ -0,0 +1,106 @@
+# pickle_app/fieldsets.py
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+
+
+def split_names(value):
+    return [name for name in (part.strip() for part in value.split(',')) if name]
+
+
+class SparseFieldsetSerializerMixin:
+    """
+    Let a ModelSerializer render a subset of its fields and opt-in nested
+    relations.
+
+    ``fields`` limits the output to the named fields. ``expand`` adds
+    fields from ``Meta.expandable_fields`` (name -> (serializer class,
+    kwargs)), which are left out by default; naming one in ``fields``
+    expands it too. ``Meta.select_related`` and ``Meta.prefetch_related``
+    map field names to the lookups they need, so related_queryset() loads
+    only what the chosen fields render.
+    """
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        selected = self.select_fields(fields, expand)
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        for name in sorted(selected & set(expandable)):
+            serializer_class, options = expandable[name]
+            self.fields[name] = serializer_class(**options)
+        for name in set(self.fields) - selected:
+            self.fields.pop(name)
+
+    @classmethod
+    def select_fields(cls, fields=None, expand=None):
+        """
+        Names of the fields to render. Unknown names raise ValidationError.
+        """
+        expandable = getattr(cls.Meta, 'expandable_fields', {})
+        expand = set(expand or ())
+        errors = {}
+        unknown = sorted(expand - set(expandable))
+        if unknown:
+            errors['expand'] = [f"Cannot expand: {', '.join(unknown)}"]
+        if fields is None:
+            selected = set(cls.Meta.fields)
+        else:
+            selected = set(fields)
+            unknown = sorted(selected - set(cls.Meta.fields) - set(expandable))
+            if unknown:
+                errors['fields'] = [f"Unknown field(s): {', '.join(unknown)}"]
+        if errors:
+            raise ValidationError(errors)
+        return selected | expand
+
+    @classmethod
+    def related_queryset(cls, queryset, fields=None, expand=None):
+        """
+        ``queryset`` with its joins and prefetches replaced by just the ones
+        the selected fields need.
+        """
+        selected = cls.select_fields(fields, expand)
+        lookups = {}
+        for kind in ('select_related', 'prefetch_related'):
+            needed = getattr(cls.Meta, kind, {})
+            # dict.fromkeys dedupes while keeping declaration order
+            lookups[kind] = list(dict.fromkeys(
+                lookup for name, names in needed.items() if name in selected for lookup in names
+            ))
+
+        queryset = queryset.select_related(None).prefetch_related(None)
+        if lookups['select_related']:
+            queryset = queryset.select_related(*lookups['select_related'])
+        if lookups['prefetch_related']:
+            queryset = queryset.prefetch_related(*lookups['prefetch_related'])
+        return queryset
+
+
+class SparseFieldsetMixin:
+    """
+    Honour ``?fields=`` and ``?expand=`` (comma-separated field names) on
+    GET requests: the serializer renders only the chosen fields and the
+    queryset joins and prefetches only what they need. Views whose
+    serializer lacks SparseFieldsetSerializerMixin are unaffected.
+    """
+    def get_fieldset(self):
+        params = self.request.query_params
+        fields = split_names(params['fields']) if params.get('fields') else None
+        return fields, split_names(params.get('expand', ''))
+
+    def uses_fieldset(self):
+        return (
+            self.request.method in SAFE_METHODS
+            and issubclass(self.get_serializer_class(), SparseFieldsetSerializerMixin)
+        )
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.uses_fieldset():
+            queryset = self.get_serializer_class().related_queryset(queryset, *self.get_fieldset())
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        if self.uses_fieldset():
+            fields, expand = self.get_fieldset()
+            kwargs.setdefault('fields', fields)
+            kwargs.setdefault('expand', expand)
+        return super().get_serializer(*args, **kwargs)
@@ -0,0 +1,71 @@
+# pickle_app/management/commands/benchmark_json.py
+import io
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from pickle_app import fastjson
+from pickle_app.models import Order
+from pickle_app.serializers import ORDER_ITEMS, OrderSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Render and parse a page of recent orders with DRF's stdlib JSON "
+        "renderer and parser and with fastjson's, fail if the results differ, "
+        "and report the time per call for each."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=100)
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def handle(self, *args, **options):
+        if fastjson.orjson is None:
+            self.stdout.write(self.style.WARNING("orjson is not installed; fastjson uses the stdlib."))
+
+        orders = list(
+            Order.objects.prefetch_related(ORDER_ITEMS).order_by('-created_at')[:options['orders']]
+        )
+        if not orders:
+            raise CommandError("There are no orders to benchmark.")
+
+        payloads = {
+            # What the order endpoints return: decimals and dates as strings
+            'OrderSerializer': OrderSerializer(orders, many=True).data,
+            # Raw Decimal and datetime values, as in the analytics responses
+            'Order.values()': list(Order.objects.filter(pk__in=[order.pk for order in orders]).values()),
+        }
+        iterations = options['iterations']
+        for name, data in payloads.items():
+            stdlib = JSONRenderer().render(data)
+            fast = fastjson.FastJSONRenderer().render(data)
+            if stdlib != fast:
+                raise CommandError(f"{name}: the renderers' output differs.")
+            if JSONParser().parse(io.BytesIO(stdlib)) != fastjson.FastJSONParser().parse(io.BytesIO(stdlib)):
+                raise CommandError(f"{name}: the parsers' output differs.")
+
+            self.stdout.write(f"{name}, {len(orders)} orders, {len(stdlib)} bytes:")
+            self.report('render', iterations, JSONRenderer().render, fastjson.FastJSONRenderer().render, data)
+            self.report(
+                'parse', iterations,
+                lambda body: JSONParser().parse(io.BytesIO(body)),
+                lambda body: fastjson.FastJSONParser().parse(io.BytesIO(body)),
+                stdlib,
+            )
+
+    def report(self, label, iterations, stdlib, fast, argument):
+        timings = [self.time(function, argument, iterations) for function in (stdlib, fast)]
+        self.stdout.write(
+            f"  {label}: stdlib {timings[0]:.3f} ms, fastjson {timings[1]:.3f} ms, "
+            f"{timings[0] / timings[1]:.1f}x"
+        )
+
+    def time(self, function, argument, iterations):
+        function(argument)
+        started = time.perf_counter()
+        for _ in range(iterations):
+            function(argument)
+        return (time.perf_counter() - started) * 1000 / iterations
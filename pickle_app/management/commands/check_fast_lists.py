@@ -0,0 +1,111 @@
+# pickle_app/management/commands/check_fast_lists.py
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from pickle_app.async_views import setup_view
+from pickle_app.views import InventoryViewSet, ProductViewSet, SearchView
+
+# (name, view class, path, query strings to compare). Orderings must be
+# total, or the two paths may legitimately return ties in different orders.
+ENDPOINTS = [
+    ('products', ProductViewSet, '/api/products/', [
+        {'ordering': '-created_at'},
+        {'ordering': 'name'},
+        {'ordering': '-created_at', 'fields': 'id,name,price,primary_image'},
+        {'ordering': '-created_at', 'expand': 'variants'},
+    ]),
+    ('search', SearchView, '/api/search/', [
+        {'sort_by': 'newest'},
+        {'sort_by': 'name', 'fields': 'id,slug,min_price,max_price'},
+    ]),
+    ('inventory', InventoryViewSet, '/api/inventory/', [
+        {},
+        {'ordering': 'quantity'},
+        {'fields': 'id,product_name,quantity,is_low_stock'},
+    ]),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the product, search and inventory lists with and without the "
+        "values_list() fast path (fastpath.ValuesListMixin), fail if the JSON "
+        "differs, and report the time per request for each."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--page-size', type=int, default=50)
+
+    def handle(self, *args, **options):
+        self.factory = APIRequestFactory(SERVER_NAME='localhost')
+        self.user = get_user_model()(username='check_fast_lists', role='ADMIN')
+        iterations = options['iterations']
+
+        mismatches = 0
+        for name, view_class, path, cases in ENDPOINTS:
+            pagination_class = type(
+                'CheckPagination', (view_class.pagination_class,), {'page_size': options['page_size']}
+            )
+            for params in cases:
+                views = {
+                    fast: self.build_view(view_class, pagination_class, use_values_list=fast)
+                    for fast in (False, True)
+                }
+                label = f"{name} {'&'.join(f'{k}={v}' for k, v in params.items()) or '(default)'}"
+                if not self.uses_fast_path(view_class, path, params):
+                    self.stdout.write(f"{label}: falls back to the serializer")
+                    continue
+
+                content = {fast: self.render(view, path, params) for fast, view in views.items()}
+                if content[False] != content[True]:
+                    mismatches += 1
+                    self.stderr.write(self.style.ERROR(f"{label}: JSON differs"))
+                    continue
+
+                timings = {
+                    fast: self.time(view, path, params, iterations) for fast, view in views.items()
+                }
+                self.stdout.write(
+                    f"{label}: identical ({len(content[True])} bytes); "
+                    f"serializer {timings[False]:.2f} ms, values {timings[True]:.2f} ms, "
+                    f"{timings[False] / timings[True]:.1f}x"
+                )
+
+        if mismatches:
+            raise CommandError(f"{mismatches} list(s) render differently on the fast path.")
+        self.stdout.write(self.style.SUCCESS("All fast-path lists match their serializers."))
+
+    def build_view(self, view_class, pagination_class, **initkwargs):
+        initkwargs['pagination_class'] = pagination_class
+        if hasattr(view_class, 'catalog_cache_timeout'):
+            initkwargs['catalog_cache_timeout'] = 0  # Measure rendering, not cache hits
+        if hasattr(view_class, 'get_extra_actions'):
+            return view_class.as_view({'get': 'list'}, **initkwargs)
+        return view_class.as_view(**initkwargs)
+
+    def request(self, path, params):
+        request = self.factory.get(path, params, HTTP_ACCEPT='application/json')
+        force_authenticate(request, user=self.user)
+        return request
+
+    def uses_fast_path(self, view_class, path, params):
+        actions = {'get': 'list'} if hasattr(view_class, 'get_extra_actions') else None
+        view = setup_view(view_class, self.request(path, params), {}, actions)
+        return view.get_values_plan() is not None
+
+    def render(self, view, path, params):
+        response = view(self.request(path, params))
+        if response.status_code != 200:
+            raise CommandError(f"GET {path} {params} returned {response.status_code}: {response.data}")
+        return response.render().content
+
+    def time(self, view, path, params, iterations):
+        self.render(view, path, params)
+        started = time.perf_counter()
+        for _ in range(iterations):
+            self.render(view, path, params)
+        return (time.perf_counter() - started) * 1000 / iterations
@@ -0,0 +1,264 @@
+# pickle_app/management/commands/import_catalog.py
+import csv
+import datetime
+import json
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, transaction
+from django.utils.text import slugify
+
+from pickle_app.bulk import upsert
+from pickle_app.cache import bump_catalog_version
+from pickle_app.models import Batch, Category, InventoryItem, Product, ProductVariant
+from pickle_app.search import refresh_search_vectors
+from pickle_app.stock import DEFAULT_LOW_STOCK_THRESHOLD, refresh_variant_stock
+from pickle_app.summaries import refresh_product_summaries
+
+COLUMNS = (
+    'category', 'slug', 'name', 'description', 'ingredients', 'nutritional_info',
+    'price', 'available', 'featured',
+    'sku', 'size', 'variant_price',
+    'batch_number', 'production_date', 'expiry_date', 'quantity', 'low_stock_threshold',
+)
+
+PRODUCT_UPDATE_FIELDS = [
+    'name', 'category', 'description', 'ingredients', 'nutritional_info',
+    'price', 'available', 'featured', 'updated_at',
+]
+VARIANT_UPDATE_FIELDS = ['product', 'size', 'price']
+BATCH_UPDATE_FIELDS = ['production_date', 'expiry_date']
+INVENTORY_UPDATE_FIELDS = ['quantity', 'low_stock_threshold', 'updated_at']
+
+
+def read_csv(stream):
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_jsonl(stream):
+    for line_num, line in enumerate(stream, 1):
+        line = line.strip()
+        if line:
+            yield line_num, json.loads(line)
+
+
+READERS = {'csv': read_csv, 'jsonl': read_jsonl}
+
+
+def text(row, name, required=False):
+    value = row.get(name)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise ValueError(f"'{name}' is required")
+    return value
+
+
+def decimal(row, name, default=None):
+    value = text(row, name)
+    if not value:
+        if default is None:
+            raise ValueError(f"'{name}' is required")
+        return default
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValueError(f"'{name}' is not a number: {value!r}")
+
+
+def integer(row, name, default):
+    value = text(row, name)
+    if not value:
+        return default
+    if not value.isdigit():
+        raise ValueError(f"'{name}' is not a non-negative integer: {value!r}")
+    return int(value)
+
+
+def boolean(row, name, default):
+    value = text(row, name).lower()
+    if not value:
+        return default
+    if value in ('1', 'true', 'yes', 'y', 't'):
+        return True
+    if value in ('0', 'false', 'no', 'n', 'f'):
+        return False
+    raise ValueError(f"'{name}' is not a boolean: {value!r}")
+
+
+def date(row, name):
+    value = text(row, name, required=True)
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"'{name}' is not an ISO date: {value!r}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream products, variants, batches and inventory from a CSV or JSONL "
+        "file and upsert them in chunks. Each record is one product, optionally "
+        "with one variant (sku) and one inventory row (batch_number). Columns: "
+        + ', '.join(COLUMNS) + '.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for stdin.")
+        parser.add_argument('--format', choices=sorted(READERS), help="Defaults to the file extension.")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or Path(path).suffix.lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError("Cannot tell the format from the file name; pass --format csv or --format jsonl.")
+
+        self.categories = {}
+        self.imported = self.skipped = 0
+        self.written = {model: set() for model in (Product, ProductVariant, Batch, InventoryItem)}
+        started = time.monotonic()
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        try:
+            records = READERS[file_format](stream)
+            while True:
+                chunk = list(islice(records, options['chunk_size']))
+                if not chunk:
+                    break
+                self.import_chunk(chunk)
+        except (csv.Error, json.JSONDecodeError, UnicodeDecodeError) as exc:
+            raise CommandError(f"Could not read {path}: {exc}")
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        # Bulk writes skip the signals that normally invalidate catalog caches
+        bump_catalog_version()
+
+        written = {model: len(ids) for model, ids in self.written.items()}
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {self.imported} records in {time.monotonic() - started:.1f}s: "
+            f"{written[Product]} products, {written[ProductVariant]} variants, "
+            f"{written[Batch]} batches, {written[InventoryItem]} inventory rows. "
+            f"Skipped {self.skipped}."
+        ))
+
+    def import_chunk(self, chunk):
+        records = []
+        for line, row in chunk:
+            try:
+                if not isinstance(row, dict):
+                    raise ValueError("expected an object")
+                records.append((line, self.parse(row)))
+            except ValueError as exc:
+                self.skip(line, exc)
+
+        self.resolve_categories({record['category'] for _, record in records})
+        valid = []
+        for line, record in records:
+            if record['category'] in self.categories:
+                valid.append(record)
+            else:
+                self.skip(line, f"unknown category {record['category']!r}")
+        if not valid:
+            return
+
+        try:
+            with transaction.atomic():
+                self.write(valid)
+        except DatabaseError as exc:
+            raise CommandError(f"Import failed in the chunk starting at line {chunk[0][0]}: {exc}")
+        self.imported += len(valid)
+
+    def parse(self, row):
+        name = text(row, 'name', required=True)
+        price = decimal(row, 'price')
+        record = {
+            'category': text(row, 'category', required=True),
+            'product': Product(
+                slug=text(row, 'slug') or slugify(name),
+                name=name,
+                description=text(row, 'description'),
+                ingredients=text(row, 'ingredients'),
+                nutritional_info=text(row, 'nutritional_info') or None,
+                price=price,
+                available=boolean(row, 'available', True),
+                featured=boolean(row, 'featured', False),
+            ),
+            'variant': None,
+            'batch': None,
+            'inventory': None,
+        }
+
+        sku = text(row, 'sku')
+        if sku:
+            record['variant'] = ProductVariant(
+                sku=sku,
+                size=text(row, 'size', required=True),
+                price=decimal(row, 'variant_price', default=price),
+            )
+
+        batch_number = text(row, 'batch_number')
+        if batch_number:
+            if not sku:
+                raise ValueError("'batch_number' needs a 'sku'")
+            record['batch'] = Batch(
+                batch_number=batch_number,
+                production_date=date(row, 'production_date'),
+                expiry_date=date(row, 'expiry_date'),
+            )
+            record['inventory'] = InventoryItem(
+                quantity=integer(row, 'quantity', 0),
+                low_stock_threshold=integer(row, 'low_stock_threshold', DEFAULT_LOW_STOCK_THRESHOLD),
+            )
+        return record
+
+    def resolve_categories(self, slugs):
+        missing = slugs - set(self.categories)
+        if missing:
+            self.categories.update(Category.objects.filter(slug__in=missing).values_list('slug', 'id'))
+
+    def write(self, records):
+        for record in records:
+            record['product'].category_id = self.categories[record['category']]
+        product_ids = upsert(
+            Product, [record['product'] for record in records], ['slug'], PRODUCT_UPDATE_FIELDS
+        )
+
+        records = [record for record in records if record['variant']]
+        for record in records:
+            record['variant'].product_id = product_ids[record['product'].slug]
+        variant_ids = upsert(
+            ProductVariant, [record['variant'] for record in records], ['sku'], VARIANT_UPDATE_FIELDS
+        )
+
+        records = [record for record in records if record['batch']]
+        batch_ids = upsert(
+            Batch, [record['batch'] for record in records], ['batch_number'], BATCH_UPDATE_FIELDS
+        )
+        for record in records:
+            record['inventory'].product_variant_id = variant_ids[record['variant'].sku]
+            record['inventory'].batch_id = batch_ids[record['batch'].batch_number]
+        inventory_ids = upsert(
+            InventoryItem, [record['inventory'] for record in records],
+            ['product_variant', 'batch'], INVENTORY_UPDATE_FIELDS
+        )
+
+        # Work the model signals would have done for single saves
+        refresh_search_vectors(Product.objects.filter(pk__in=product_ids.values()))
+        refresh_product_summaries(Product.objects.filter(pk__in=product_ids.values()))
+        refresh_variant_stock(variant_ids.values())
+
+        self.written[Product].update(product_ids.values())
+        self.written[ProductVariant].update(variant_ids.values())
+        self.written[Batch].update(batch_ids.values())
+        self.written[InventoryItem].update(inventory_ids.values())
+
+    def skip(self, line, reason):
+        self.skipped += 1
+        self.stderr.write(f"Line {line}: {reason}")
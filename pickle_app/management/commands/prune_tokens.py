@@ -0,0 +1,43 @@
+# pickle_app/management/commands/prune_tokens.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from pickle_app.revocation import get_revocation_filter
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired outstanding and blacklisted refresh tokens in batches, "
+        "then rebuild the revocation filter from what is left."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--no-rebuild', action='store_true',
+            help="Skip rebuilding the revocation filter."
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        expired = OutstandingToken.objects.filter(expires_at__lte=timezone.now()).order_by('pk')
+
+        outstanding = blacklisted = 0
+        while True:
+            # Short transactions keep locks brief while login keeps inserting
+            with transaction.atomic():
+                ids = list(expired.values_list('pk', flat=True)[:batch_size])
+                if not ids:
+                    break
+                blacklisted += BlacklistedToken.objects.filter(token_id__in=ids).delete()[0]
+                outstanding += OutstandingToken.objects.filter(pk__in=ids).delete()[0]
+
+        self.stdout.write(
+            f"Deleted {outstanding} outstanding and {blacklisted} blacklisted expired tokens."
+        )
+
+        if not options['no_rebuild']:
+            get_revocation_filter().rebuild()
+            self.stdout.write("Rebuilt the revocation filter.")
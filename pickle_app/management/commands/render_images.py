@@ -0,0 +1,30 @@
+# pickle_app/management/commands/render_images.py
+from django.core.management.base import BaseCommand
+
+from pickle_app.models import ProductImage
+from pickle_app.tasks import render_product_image
+
+
+class Command(BaseCommand):
+    help = (
+        "Queue rendition generation for product images that have none yet, "
+        "e.g. images uploaded before renditions existed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help="Regenerate renditions for every image."
+        )
+
+    def handle(self, *args, **options):
+        force = options['force']
+        images = ProductImage.objects.all()
+        if not force:
+            images = images.filter(renditions={})
+
+        queued = 0
+        for image_id in images.values_list('pk', flat=True).iterator():
+            render_product_image.delay(image_id, force=force)
+            queued += 1
+        self.stdout.write(f"Queued {queued} images for rendering.")
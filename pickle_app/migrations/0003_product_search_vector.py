@@ -0,0 +1,57 @@
+# Generated by Django 4.2.10 on 2026-10-18 02:26
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+FORWARD_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX product_search_vector_gin ON pickle_app_product USING gin (search_vector)",
+    "CREATE INDEX product_name_trgm_gin ON pickle_app_product USING gin (name gin_trgm_ops)",
+    """
+    UPDATE pickle_app_product p SET search_vector =
+        setweight(to_tsvector('english', coalesce(p.name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(c.name, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(p.ingredients, '')), 'C') ||
+        setweight(to_tsvector('english', coalesce(p.description, '')), 'D')
+    FROM pickle_app_category c
+    WHERE c.id = p.category_id
+    """,
+]
+
+REVERSE_SQL = [
+    "DROP INDEX IF EXISTS product_name_trgm_gin",
+    "DROP INDEX IF EXISTS product_search_vector_gin",
+]
+
+
+def run_on_postgres(statements):
+    # Full-text and trigram indexes only exist on PostgreSQL; other
+    # databases use the icontains fallback in pickle_app.search.
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pickle_app", "0002_orderitemallocation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(
+            run_on_postgres(FORWARD_SQL), run_on_postgres(REVERSE_SQL)
+        ),
+    ]
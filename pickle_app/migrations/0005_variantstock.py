@@ -0,0 +1,84 @@
+# Generated by Django 4.2.10 on 2026-10-18 02:32
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def backfill_variant_stock(apps, schema_editor):
+    InventoryItem = apps.get_model("pickle_app", "InventoryItem")
+    ProductVariant = apps.get_model("pickle_app", "ProductVariant")
+    VariantStock = apps.get_model("pickle_app", "VariantStock")
+
+    # Same rules as stock.refresh_variant_stock(): expired batches don't count
+    today = timezone.localdate()
+    in_date = Q(inventory__batch__expiry_date__gte=today)
+    earliest_batch = (
+        InventoryItem.objects.filter(
+            product_variant=OuterRef("pk"),
+            quantity__gt=0,
+            batch__expiry_date__gte=today,
+        )
+        .order_by("batch__expiry_date", "id")
+        .values("batch_id")[:1]
+    )
+    rows = ProductVariant.objects.annotate(
+        total=Coalesce(Sum("inventory__quantity", filter=in_date), 0),
+        threshold=Coalesce(Max("inventory__low_stock_threshold"), 10),
+        earliest_batch_id=Subquery(earliest_batch),
+    ).values_list("pk", "total", "threshold", "earliest_batch_id")
+    VariantStock.objects.bulk_create(
+        [
+            VariantStock(
+                product_variant_id=pk,
+                on_hand=total,
+                low_stock_threshold=threshold,
+                is_low_stock=total <= threshold,
+                earliest_batch_id=batch_id,
+            )
+            for pk, total, threshold, batch_id in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pickle_app", "0004_keyset_pagination_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="VariantStock",
+            fields=[
+                (
+                    "product_variant",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stock",
+                        serialize=False,
+                        to="pickle_app.productvariant",
+                    ),
+                ),
+                ("on_hand", models.PositiveIntegerField(default=0)),
+                ("low_stock_threshold", models.PositiveIntegerField(default=10)),
+                ("is_low_stock", models.BooleanField(default=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "earliest_batch",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="pickle_app.batch",
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(backfill_variant_stock, migrations.RunPython.noop),
+    ]
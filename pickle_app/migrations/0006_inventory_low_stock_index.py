@@ -0,0 +1,21 @@
+# Generated by Django 4.2.10 on 2026-10-18 02:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pickle_app", "0005_variantstock"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="inventoryitem",
+            index=models.Index(
+                condition=models.Q(("quantity__lte", models.F("low_stock_threshold"))),
+                fields=["created_at", "id"],
+                name="inventory_low_stock_idx",
+            ),
+        ),
+    ]
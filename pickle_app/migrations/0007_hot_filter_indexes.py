@@ -0,0 +1,70 @@
+# Generated by Django 4.2.10 on 2026-10-18 02:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pickle_app", "0006_inventory_low_stock_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="batch",
+            index=models.Index(
+                fields=["expiry_date", "id"], name="batch_expiry_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["status", "created_at", "id"],
+                name="order_status_created_id_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["user", "status", "created_at", "id"],
+                name="order_user_status_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["order", "status"], name="payment_order_status_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["available", "featured", "category"],
+                name="product_avail_feat_cat_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("available", True)),
+                fields=["category", "price"],
+                name="product_avail_cat_price_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("available", True)),
+                fields=["price"],
+                name="product_avail_price_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("available", True)),
+                fields=["created_at"],
+                name="product_avail_created_idx",
+            ),
+        ),
+    ]
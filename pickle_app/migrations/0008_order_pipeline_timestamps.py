@@ -0,0 +1,23 @@
+# Generated by Django 4.2.10 on 2026-10-18 02:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pickle_app", "0007_hot_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="notified_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="stock_allocated_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
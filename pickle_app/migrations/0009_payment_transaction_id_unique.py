@@ -0,0 +1,41 @@
+# Generated by Django 4.2.10 on 2026-10-18 02:38
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def deduplicate_transaction_ids(apps, schema_editor):
+    # Repeated confirmations left duplicate rows behind. Keep the first payment
+    # for each transaction id and tag the others so they can be reconciled.
+    Payment = apps.get_model("pickle_app", "Payment")
+    Payment.objects.filter(transaction_id="").update(transaction_id=None)
+
+    duplicated = (
+        Payment.objects.exclude(transaction_id=None)
+        .values("transaction_id")
+        .annotate(rows=Count("id"))
+        .filter(rows__gt=1)
+        .values_list("transaction_id", flat=True)
+    )
+    for transaction_id in duplicated:
+        payments = Payment.objects.filter(transaction_id=transaction_id).order_by("id")
+        for payment in payments[1:]:
+            suffix = f"#dup{payment.pk}"
+            payment.transaction_id = transaction_id[: 200 - len(suffix)] + suffix
+            payment.save(update_fields=["transaction_id"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pickle_app", "0008_order_pipeline_timestamps"),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate_transaction_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="payment",
+            name="transaction_id",
+            field=models.CharField(blank=True, max_length=200, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.10 on 2026-10-18 03:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pickle_app", "0010_sales_rollups"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="inventoryitem",
+            name="expired_quantity",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.10 on 2026-10-18 03:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pickle_app", "0011_inventory_expired_quantity"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productimage",
+            name="renditions",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.10 on 2026-10-18 03:11
+
+from django.db import migrations, models
+from django.db.models import F, Max, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def backfill_product_summaries(apps, schema_editor):
+    Product = apps.get_model("pickle_app", "Product")
+    ProductImage = apps.get_model("pickle_app", "ProductImage")
+    ProductVariant = apps.get_model("pickle_app", "ProductVariant")
+
+    primary_image = (
+        ProductImage.objects.filter(product=OuterRef("pk"))
+        .order_by("-is_primary", "id")
+        .values("pk")[:1]
+    )
+    variants = (
+        ProductVariant.objects.filter(product=OuterRef("pk"))
+        .order_by()
+        .values("product")
+    )
+    Product.objects.update(
+        primary_image=Subquery(primary_image),
+        min_price=Coalesce(
+            Subquery(variants.annotate(low=Min("price")).values("low")), F("price")
+        ),
+        max_price=Coalesce(
+            Subquery(variants.annotate(high=Max("price")).values("high")), F("price")
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pickle_app", "0012_product_image_renditions"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="max_price",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, editable=False, max_digits=10, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="min_price",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, editable=False, max_digits=10, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="primary_image",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="pickle_app.productimage",
+            ),
+        ),
+        migrations.RunPython(backfill_product_summaries, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 # pickle_app/models.py
 from django.db import models
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
 from django.utils.text import slugify
@@ -39,6 +40,24 @@ class Category(models.Model):
     class Meta:
         verbose_name_plural = 'Categories'
 
+class ProductQuerySet(models.QuerySet):
+    def with_related(self):
+        """
+        Load the category and the nested images and variants that
+        ProductSerializer renders, so a page costs a fixed number of queries.
+        """
+        return self.select_related('category').prefetch_related(
+            models.Prefetch('images', queryset=ProductImage.objects.order_by('id')),
+            models.Prefetch('variants', queryset=ProductVariant.objects.select_related('stock').order_by('id')),
+        )
+    
+    def for_listing(self):
+        """
+        Load what ProductListSerializer renders: the category and the
+        denormalised primary image, joined in the same query.
+        """
+        return self.select_related('category', 'primary_image')
+
 class Product(models.Model):
     name = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
@@ -49,8 +68,17 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     available = models.BooleanField(default=True)
     featured = models.BooleanField(default=False)
+    search_vector = SearchVectorField(null=True, editable=False)  # Maintained by signals, see search.py
+    # List-card fields maintained by signals, see summaries.py
+    primary_image = models.ForeignKey(
+        'ProductImage', on_delete=models.SET_NULL, blank=True, null=True, editable=False, related_name='+'
+    )
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True, editable=False)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ProductQuerySet.as_manager()
     
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -59,11 +87,23 @@ class Product(models.Model):
     
     def __str__(self):
         return self.name
+    
+    class Meta:
+        # Filters and sorts used by ProductViewSet and SearchView
+        indexes = [
+            models.Index(fields=['available', 'featured', 'category'], name='product_avail_feat_cat_idx'),
+            models.Index(
+                fields=['category', 'price'], condition=models.Q(available=True), name='product_avail_cat_price_idx'
+            ),
+            models.Index(fields=['price'], condition=models.Q(available=True), name='product_avail_price_idx'),
+            models.Index(fields=['created_at'], condition=models.Q(available=True), name='product_avail_created_idx'),
+        ]
 
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to='products/')
     is_primary = models.BooleanField(default=False)
+    renditions = models.JSONField(default=dict, blank=True, editable=False)  # Set by renditions.generate_renditions
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
@@ -93,17 +133,32 @@ class Batch(models.Model):
     
     def __str__(self):
         return self.batch_number
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['expiry_date', 'id'], name='batch_expiry_id_idx'),
+        ]
 
 class InventoryItem(models.Model):
     product_variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, related_name='inventory')
     batch = models.ForeignKey(Batch, on_delete=models.CASCADE, related_name='inventory_items')
     quantity = models.PositiveIntegerField()
     low_stock_threshold = models.PositiveIntegerField(default=10)
+    expired_quantity = models.PositiveIntegerField(default=0)  # Written off by stock.expire_stock
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
-        unique_together = ('product_variant', 'batch')
+        unique_together = ('product_variant', 'batch')  # Its index also serves FIFO allocation by variant
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='inventory_created_id_idx'),
+            # Low-stock report, see stock.low_stock_items
+            models.Index(
+                fields=['created_at', 'id'],
+                condition=models.Q(quantity__lte=models.F('low_stock_threshold')),
+                name='inventory_low_stock_idx',
+            ),
+        ]
     
     @property
     def is_low_stock(self):
@@ -112,6 +167,30 @@ class InventoryItem(models.Model):
     def __str__(self):
         return f"{self.product_variant} - Batch {self.batch.batch_number} - {self.quantity} units"
 
+class VariantStock(models.Model):
+    """
+    Per-variant stock summary, maintained from InventoryItem by
+    stock.refresh_variant_stock() so availability can be read without
+    aggregating across batches.
+    """
+    product_variant = models.OneToOneField(
+        ProductVariant, on_delete=models.CASCADE, primary_key=True, related_name='stock'
+    )
+    on_hand = models.PositiveIntegerField(default=0)
+    low_stock_threshold = models.PositiveIntegerField(default=10)
+    is_low_stock = models.BooleanField(default=True)
+    earliest_batch = models.ForeignKey(
+        Batch, on_delete=models.SET_NULL, blank=True, null=True, related_name='+'
+    )  # Earliest-expiring non-expired batch with stock
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    @property
+    def in_stock(self):
+        return self.on_hand > 0
+    
+    def __str__(self):
+        return f"{self.product_variant} - {self.on_hand} on hand"
+
 class Order(models.Model):
     STATUS_CHOICES = (
         ('PENDING', 'Pending'),
@@ -133,6 +212,8 @@ class Order(models.Model):
     tax = models.DecimalField(max_digits=10, decimal_places=2)
     total = models.DecimalField(max_digits=10, decimal_places=2)
     notes = models.TextField(blank=True, null=True)
+    stock_allocated_at = models.DateTimeField(blank=True, null=True)  # Set by tasks.process_order
+    notified_at = models.DateTimeField(blank=True, null=True)  # Set by tasks.send_order_notifications
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -144,6 +225,19 @@ class Order(models.Model):
     
     def __str__(self):
         return self.order_number
+    
+    class Meta:
+        # Keyset pagination indexes, see pagination.KeysetPagination
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='order_created_id_idx'),
+            models.Index(fields=['user', 'created_at', 'id'], name='order_user_created_id_idx'),
+            models.Index(fields=['total', 'id'], name='order_total_id_idx'),
+            # ?status= filter for staff and for customers' own orders
+            models.Index(fields=['status', 'created_at', 'id'], name='order_status_created_id_idx'),
+            models.Index(fields=['user', 'status', 'created_at', 'id'], name='order_user_status_created_idx'),
+            # Orders changed since the last sales rollup, see analytics.refresh_sales_rollups
+            models.Index(fields=['updated_at'], name='order_updated_idx'),
+        ]
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
@@ -158,6 +252,19 @@ class OrderItem(models.Model):
     def __str__(self):
         return f"{self.order.order_number} - {self.product_variant.product.name} - {self.quantity} units"
 
+class OrderItemAllocation(models.Model):
+    """
+    Records how much of an order item was taken from each inventory row, so
+    cancellations can return stock to the batches it came from.
+    """
+    order_item = models.ForeignKey(OrderItem, on_delete=models.CASCADE, related_name='allocations')
+    inventory_item = models.ForeignKey(InventoryItem, on_delete=models.CASCADE, related_name='allocations')
+    quantity = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.order_item} - {self.quantity} units from batch {self.inventory_item.batch_id}"
+
 class Payment(models.Model):
     STATUS_CHOICES = (
         ('PENDING', 'Pending'),
@@ -175,10 +282,68 @@ class Payment(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='payments')
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHOD_CHOICES)
-    transaction_id = models.CharField(max_length=200, blank=True, null=True)
+    transaction_id = models.CharField(max_length=200, unique=True, blank=True, null=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
-        return f"{self.order.order_number} - {self.get_status_display()} - {self.amount}"
\ No newline at end of file
+        return f"{self.order.order_number} - {self.get_status_display()} - {self.amount}"
+    
+    class Meta:
+        # Keyset pagination indexes, see pagination.KeysetPagination
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='payment_created_id_idx'),
+            models.Index(fields=['amount', 'id'], name='payment_amount_id_idx'),
+            models.Index(fields=['order', 'status'], name='payment_order_status_idx'),
+        ]
+
+class DailySales(models.Model):
+    """
+    Orders rolled up per day and status by analytics.refresh_sales_rollups().
+    ``revenue`` is the sum of order totals, including shipping and tax.
+    """
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    order_count = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    def __str__(self):
+        return f"{self.date} - {self.get_status_display()} - {self.revenue}"
+    
+    class Meta:
+        unique_together = ('date', 'status')
+        verbose_name_plural = 'Daily sales'
+
+class DailyProductSales(models.Model):
+    """
+    Order lines rolled up per day, status and variant. Product and category
+    are copied from the variant so every breakdown reads this table alone.
+    ``revenue`` is the sum of line totals at the purchase price.
+    """
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    product_variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, related_name='+')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+')
+    line_count = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    def __str__(self):
+        return f"{self.date} - {self.product_variant_id} - {self.units} units"
+    
+    class Meta:
+        unique_together = ('date', 'status', 'product_variant')
+        verbose_name_plural = 'Daily product sales'
+
+class RollupCheckpoint(models.Model):
+    """
+    How far each incremental rollup has read its source rows.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    updated_through = models.DateTimeField(blank=True, null=True)
+    
+    def __str__(self):
+        return f"{self.name} through {self.updated_through}"
@@ -0,0 +1,119 @@
+# pickle_app/pagination.py
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Field, Func, Value
+from django.db.models.lookups import GreaterThan, LessThan
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+
+
+class Row(Func):
+    """
+    An SQL row value, ``(a, b)``; comparing two of them compares the
+    columns in order, the way a composite index is sorted.
+    """
+    function = ''
+    output_field = Field()
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination over a ``(field, id)`` keyset.
+
+    DRF's CursorPagination positions on the first ordering field only and
+    skips rows that share its value with an OFFSET. Here the cursor carries
+    the boundary row's id as well, so every page is a single row-value
+    comparison, ``(field, id) > (value, id)``, that an index on
+    ``(field, id)`` serves as one range scan, with no OFFSET and no COUNT.
+
+    Any field allowed by the view's OrderingFilter can be used; ``id`` is
+    appended in the same direction to make the ordering total.
+    """
+    ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = None
+        for backend in getattr(view, 'filter_backends', []):
+            if hasattr(backend, 'get_ordering'):
+                ordering = backend().get_ordering(request, queryset, view)
+                break
+        if not ordering:
+            ordering = self.ordering
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+
+        field = ordering[0]
+        if field.lstrip('-') in ('id', 'pk'):
+            return (field,)
+        return (field, '-id' if field.startswith('-') else 'id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = bool(self.cursor and self.cursor.reverse)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(self._flip(field) for field in ordering)
+
+        try:
+            if self.cursor and self.cursor.position:
+                queryset = queryset.filter(self._after(queryset, ordering, self.cursor.position))
+            results = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        except (ValidationError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        has_following = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = True
+            self.has_previous = has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = bool(self.cursor and self.cursor.position)
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        cursor = Cursor(offset=0, reverse=False, position=self._position(self.page[-1]))
+        return self.encode_cursor(cursor)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        cursor = Cursor(offset=0, reverse=True, position=self._position(self.page[0]))
+        return self.encode_cursor(cursor)
+
+    def _position(self, instance):
+        name = self.ordering[0].lstrip('-')
+        return json.dumps([str(getattr(instance, name)), instance.pk])
+
+    def _after(self, queryset, ordering, position):
+        try:
+            value, pk = json.loads(position)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        field = ordering[0]
+        name = field.lstrip('-')
+        lookup = LessThan if field.startswith('-') else GreaterThan
+        if name in ('id', 'pk'):
+            return lookup(F('pk'), Value(pk))
+        # Annotations (e.g. the expiring report's expiry_date) or model fields
+        annotation = queryset.query.annotations.get(name)
+        output_field = annotation.output_field if annotation is not None else queryset.model._meta.get_field(name)
+        return lookup(Row(F(name), F('pk')), Row(Value(value, output_field=output_field), Value(pk)))
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
@@ -25,7 +25,7 @@ class IsOwnerOrAdmin(permissions.BasePermission):
         
         # Instance must have an attribute named `user` or `owner`
         if hasattr(obj, 'user'):
-            return obj.user == request.user
+            return obj.user_id == request.user.id
         elif hasattr(obj, 'owner'):
-            return obj.owner == request.user
+            return obj.owner_id == request.user.id
         return False
\ No newline at end of file
@@ -0,0 +1,90 @@
+# pickle_app/renditions.py
+import io
+import posixpath
+
+from django.core.files.base import ContentFile
+from PIL import Image
+from pilkit.processors import ResizeToFit, Transpose
+from pilkit.utils import save_image
+
+# Rendition name -> maximum width in pixels; originals are never upscaled
+RENDITION_WIDTHS = {
+    'zoom': 1200,
+    'card': 480,
+    'thumbnail': 160,
+}
+# srcset key -> (PIL format, save options)
+RENDITION_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 6}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def generate_renditions(product_image):
+    """
+    Resize ``product_image`` to every RENDITION_WIDTHS size in every
+    RENDITION_FORMATS format, store the files next to the original and
+    record them in ``product_image.renditions``.
+
+    The original is read once; each size is scaled down from the previous,
+    larger one. Files from an earlier run are deleted afterwards.
+    """
+    field = product_image.image
+    storage = field.storage
+    with field.open('rb') as source:
+        image = Transpose().process(Image.open(source))
+        image.load()
+
+    folder = posixpath.join(posixpath.dirname(field.name), 'renditions', str(product_image.pk))
+    sizes = {}
+    for name, width in sorted(RENDITION_WIDTHS.items(), key=lambda item: -item[1]):
+        image = ResizeToFit(width=width, upscale=False).process(image)
+        sizes[name] = {'width': image.width, 'height': image.height}
+        for key, (image_format, options) in RENDITION_FORMATS.items():
+            buffer = io.BytesIO()
+            save_image(image, buffer, image_format, options)
+            sizes[name][key] = storage.save(
+                posixpath.join(folder, f'{name}.{key}'), ContentFile(buffer.getvalue())
+            )
+
+    previous = rendition_paths(product_image.renditions)
+    product_image.renditions = {'source': field.name, 'sizes': sizes}
+    product_image.save(update_fields=['renditions'])
+    for path in previous - rendition_paths(product_image.renditions):
+        storage.delete(path)
+
+
+def rendition_paths(renditions):
+    return {
+        size[key]
+        for size in renditions.get('sizes', {}).values()
+        for key in RENDITION_FORMATS if key in size
+    }
+
+
+def srcset(product_image, request=None):
+    """
+    ``{format: srcset}`` for the image's renditions, smallest first, or None
+    until they have been generated. URLs are absolute when ``request`` is
+    given, like the serializers' ``image`` URLs.
+    """
+    return srcset_from(product_image.renditions, product_image.image.storage, request)
+
+
+def srcset_from(renditions, storage, request=None):
+    sizes = renditions.get('sizes')
+    if not sizes:
+        return None
+    # Small originals give several sizes the same width; list each width once,
+    # from the smaller rendition (jsonb doesn't keep the stored key order)
+    by_width = {sizes[name]['width']: sizes[name] for name in RENDITION_WIDTHS if name in sizes}
+    ordered = [by_width[width] for width in sorted(by_width)]
+
+    def url(name):
+        url = storage.url(name)
+        return request.build_absolute_uri(url) if request is not None else url
+
+    return {
+        key: ', '.join(f"{url(size[key])} {size['width']}w" for size in ordered)
+        for key in RENDITION_FORMATS
+    }
@@ -0,0 +1,258 @@
+# pickle_app/revocation.py
+import abc
+import hashlib
+import logging
+import math
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from redis import Redis, RedisError
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+logger = logging.getLogger(__name__)
+
+REVOCATION_CAPACITY = 100_000
+REVOCATION_ERROR_RATE = 0.001
+REVOCATION_FILTER_KEY = 'auth:revoked:bloom'
+REVOCATION_SYNC_INTERVAL = 5  # Seconds between blacklist syncs of a local filter
+REVOCATION_REBUILD_TIMEOUT = 60 * 10  # Lock timeout for a Redis bitmap rebuild
+
+# Set the bits only if the bitmap exists, so a flushed or evicted key is never
+# recreated holding just this one JTI
+ADD_IF_EXISTS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+for _, pos in ipairs(ARGV) do
+    redis.call('SETBIT', KEYS[1], pos, 1)
+end
+return 1
+"""
+
+
+def bloom_parameters(capacity, error_rate):
+    """
+    Bit count and hash count for ``capacity`` items at ``error_rate``.
+    """
+    size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+    hashes = max(1, round(size / capacity * math.log(2)))
+    return size, hashes
+
+
+def unexpired_revoked_jtis():
+    # Expired tokens already fail the exp check, so they never need a bit
+    return BlacklistedToken.objects.filter(
+        token__expires_at__gt=timezone.now()
+    ).values_list('token__jti', flat=True).iterator(chunk_size=2000)
+
+
+class RevocationFilter(abc.ABC):
+    """
+    Bloom filter of revoked refresh token JTIs.
+
+    ``might_contain`` never answers False for a revoked token, so a miss
+    skips the blacklist query entirely; a hit still has to be confirmed
+    against the database.
+    """
+    def __init__(self, capacity=REVOCATION_CAPACITY, error_rate=REVOCATION_ERROR_RATE):
+        self.size, self.hashes = bloom_parameters(capacity, error_rate)
+
+    def positions(self, jti):
+        digest = hashlib.blake2b(jti.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:], 'big') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    @abc.abstractmethod
+    def add(self, jti):
+        """Record ``jti`` as revoked."""
+
+    @abc.abstractmethod
+    def might_contain(self, jti):
+        """False only if ``jti`` was never revoked."""
+
+    @abc.abstractmethod
+    def rebuild(self):
+        """Reload the filter from the blacklist table."""
+
+
+class LocalRevocationFilter(RevocationFilter):
+    """
+    In-process filter for single-process deployments and tests. Revocations
+    made in this process are added at once; those made elsewhere are pulled
+    from the blacklist by the first check after ``sync_interval`` seconds (a
+    primary key range scan and a count). When the count shows rows were
+    deleted (prune_tokens) or committed out of order, the filter is rebuilt.
+    """
+    def __init__(self, *args, sync_interval=REVOCATION_SYNC_INTERVAL, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self.rebuild()
+
+    def add(self, jti):
+        with self._lock:
+            self._set(jti)
+
+    def might_contain(self, jti):
+        with self._lock:
+            if time.monotonic() >= self._next_sync:
+                self._sync()
+            return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self.positions(jti))
+
+    def rebuild(self):
+        with self._lock:
+            self._bits = bytearray((self.size + 7) // 8)
+            self._last_id = None
+            self._next_sync = 0
+
+    def _set(self, jti):
+        for pos in self.positions(jti):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def _sync(self):
+        rows = []
+        if self._last_id is not None:
+            rows = list(
+                BlacklistedToken.objects.filter(pk__gt=self._last_id)
+                .order_by('pk').values_list('pk', 'token__jti')
+            )
+        count = BlacklistedToken.objects.count()
+        if self._last_id is None or count != self._count + len(rows):
+            self._bits = bytearray((self.size + 7) // 8)
+            self._last_id = BlacklistedToken.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+            self._count = count
+            jtis = unexpired_revoked_jtis()
+        else:
+            if rows:
+                self._last_id = rows[-1][0]
+            self._count = count
+            jtis = [jti for _, jti in rows]
+        for jti in jtis:
+            self._set(jti)
+        self._next_sync = time.monotonic() + self.sync_interval
+
+
+class RedisRevocationFilter(RevocationFilter):
+    """
+    Filter stored as a Redis bitmap shared by every web process. A check is
+    one pipelined round trip with no database access. When the bitmap is
+    missing (first use, Redis restart, eviction) one process rebuilds it in
+    the background while checks fall back to the blacklist table.
+    """
+    def __init__(self, url, key=REVOCATION_FILTER_KEY, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.client = Redis.from_url(url)
+        self.key = key
+        self._add_if_exists = self.client.register_script(ADD_IF_EXISTS_SCRIPT)
+
+    def add(self, jti):
+        # A missing bitmap is left to the rebuild, which reads this JTI from
+        # the blacklist table (or re-adds it once swapped in)
+        if not self._add_if_exists(keys=[self.key], args=self.positions(jti)):
+            self.rebuild_in_background()
+
+    def might_contain(self, jti):
+        positions = self.positions(jti)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.exists(self.key)
+        for pos in positions:
+            pipe.getbit(self.key, pos)
+        exists, *bits = pipe.execute()
+        if not exists:
+            self.rebuild_in_background()
+            return True
+        return all(bits)
+
+    def rebuild_in_background(self):
+        """
+        Start a rebuild in a thread unless a process is already running one.
+        """
+        if cache.add(f'{self.key}:rebuilding', True, REVOCATION_REBUILD_TIMEOUT):
+            threading.Thread(target=self._rebuild_and_unlock, daemon=True).start()
+
+    def _rebuild_and_unlock(self):
+        try:
+            self.rebuild()
+        except Exception:
+            logger.exception("Could not rebuild the revocation filter")
+        finally:
+            cache.delete(f'{self.key}:rebuilding')
+            connection.close()
+
+    def rebuild(self):
+        """
+        Rebuild the bitmap next to the live one and swap it in, so checks
+        keep working while it is built. Revocations made during the build are
+        added again after the swap.
+        """
+        started = timezone.now()
+        building = f'{self.key}:building:{uuid.uuid4().hex}'
+        self.client.setbit(building, self.size - 1, 0)
+        pipe = self.client.pipeline(transaction=False)
+        for i, jti in enumerate(unexpired_revoked_jtis(), 1):
+            for pos in self.positions(jti):
+                pipe.setbit(building, pos, 1)
+            if i % 1000 == 0:
+                pipe.execute()
+        pipe.execute()
+        self.client.rename(building, self.key)
+
+        for jti in BlacklistedToken.objects.filter(
+            blacklisted_at__gte=started
+        ).values_list('token__jti', flat=True):
+            self.add(jti)
+
+
+_filter = None
+_filter_lock = threading.Lock()
+
+
+def get_revocation_filter():
+    global _filter
+    if _filter is None:
+        with _filter_lock:
+            if _filter is None:
+                if settings.REDIS_URL:
+                    _filter = RedisRevocationFilter(settings.REDIS_URL)
+                else:
+                    _filter = LocalRevocationFilter()
+    return _filter
+
+
+def revoke(jti):
+    """
+    Record a blacklisted JTI in the filter. Safe to call before the
+    blacklist row commits: a rolled-back revocation is only a false positive.
+    """
+    try:
+        get_revocation_filter().add(jti)
+    except RedisError:
+        logger.exception("Could not add a revoked token to the revocation filter")
+
+
+def is_revoked(jti):
+    try:
+        if not get_revocation_filter().might_contain(jti):
+            return False
+    except RedisError:
+        logger.warning("Revocation filter unavailable, checking the blacklist table", exc_info=True)
+    return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+
+class RevocableRefreshToken(RefreshToken):
+    """
+    Refresh token whose blacklist check goes through the revocation filter.
+    """
+    def check_blacklist(self):
+        if is_revoked(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
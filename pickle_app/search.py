@@ -0,0 +1,91 @@
+# pickle_app/search.py
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+)
+from django.db import connections
+from django.db.models import Case, F, IntegerField, OuterRef, Q, Subquery, Value, When
+from rest_framework import filters
+
+from .models import Category
+
+SEARCH_CONFIG = 'english'
+
+
+def is_postgres(queryset):
+    return connections[queryset.db].vendor == 'postgresql'
+
+
+def product_search_vector():
+    """
+    Weighted search document for a product: name, then category name,
+    then ingredients, then description.
+    """
+    category_name = Subquery(
+        Category.objects.filter(pk=OuterRef('category_id')).values('name')[:1]
+    )
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(category_name, weight='B', config=SEARCH_CONFIG)
+        + SearchVector('ingredients', weight='C', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='D', config=SEARCH_CONFIG)
+    )
+
+
+def refresh_search_vectors(queryset):
+    """
+    Recompute the stored search vector for the given products.
+    Does nothing on databases without full-text search support.
+    """
+    if is_postgres(queryset):
+        queryset.update(search_vector=product_search_vector())
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """
+    Ranked product search.
+
+    On PostgreSQL this matches against the stored ``search_vector``. When
+    nothing matches, it falls back to trigram similarity on the name (the
+    ``%`` operator, pg_trgm.similarity_threshold) so typos still find
+    results. Each pass is a single condition its GIN index can answer;
+    similarity is only computed for ranking the rows found. Other databases
+    use the plain ``search_fields`` lookup with a simple field-based rank.
+    Results are ordered by relevance unless the view already applied an
+    explicit ordering.
+    """
+    def filter_queryset(self, request, queryset, view):
+        search_terms = self.get_search_terms(request)
+        if not search_terms:
+            return queryset
+
+        if is_postgres(queryset):
+            term = ' '.join(search_terms)
+            query = SearchQuery(term, config=SEARCH_CONFIG, search_type='websearch')
+            matches = queryset.filter(search_vector=query)
+            if not matches.exists():
+                matches = queryset.filter(name__trigram_similar=term)
+            queryset = matches.annotate(
+                search_rank=SearchRank(F('search_vector'), query),
+                search_similarity=TrigramSimilarity('name', term),
+            )
+            ranking = ['-search_rank', '-search_similarity', 'pk']
+        else:
+            queryset = super().filter_queryset(request, queryset, view)
+            name_match = Q()
+            category_match = Q()
+            for term in search_terms:
+                name_match &= Q(name__icontains=term)
+                category_match &= Q(category__name__icontains=term)
+            queryset = queryset.annotate(
+                search_rank=Case(
+                    When(name_match, then=Value(3)),
+                    When(category_match, then=Value(2)),
+                    default=Value(1),
+                    output_field=IntegerField(),
+                )
+            )
+            ranking = ['-search_rank', 'pk']
+
+        if not queryset.query.order_by:
+            queryset = queryset.order_by(*ranking)
+        return queryset
@@ -1,7 +1,18 @@
 # pickle_app/serializers.py
+from decimal import Decimal
+
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db.models import Prefetch
 from django.contrib.auth.password_validation import validate_password
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from .authentication import ROLE_CLAIM
+from .fieldsets import SparseFieldsetSerializerMixin
+from .renditions import srcset, srcset_from
+from .revocation import RevocableRefreshToken
+from .utils import calculate_order_totals
 from .models import (
     Category, Product, ProductImage, ProductVariant,
     Batch, InventoryItem, Order, OrderItem, Payment
@@ -9,6 +20,11 @@ from .models import (
 
 User = get_user_model()
 
+# Nested relations rendered below, loaded only when selected (see fieldsets.py)
+PRODUCT_IMAGES = Prefetch('images', queryset=ProductImage.objects.order_by('id'))
+PRODUCT_VARIANTS = Prefetch('variants', queryset=ProductVariant.objects.select_related('stock').order_by('id'))
+ORDER_ITEMS = Prefetch('items', queryset=OrderItem.objects.select_related('product_variant__product').order_by('id'))
+
 # User Serializers
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -44,6 +60,36 @@ class PasswordChangeSerializer(serializers.Serializer):
             raise serializers.ValidationError({"new_password": "Password fields didn't match."})
         return attrs
 
+# Token Serializers
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Embed the user's role in the issued tokens so requests can be
+    authorized from the claims alone.
+    """
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token[ROLE_CLAIM] = user.role
+        return token
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Re-read the role on refresh so role changes and deactivations reach new
+    access tokens instead of living as long as the refresh token. Blacklist
+    checks go through the revocation filter.
+    """
+    token_class = RevocableRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        role = User.objects.filter(
+            pk=refresh[api_settings.USER_ID_CLAIM], is_active=True
+        ).values_list('role', flat=True).first()
+        if role is None:
+            raise AuthenticationFailed("User is inactive or no longer exists.", code='user_inactive')
+        refresh[ROLE_CLAIM] = role
+        return super().validate({**attrs, 'refresh': str(refresh)})
+
 # Category Serializers
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -53,18 +99,28 @@ class CategorySerializer(serializers.ModelSerializer):
 
 # Product Serializers
 class ProductImageSerializer(serializers.ModelSerializer):
+    srcset = serializers.SerializerMethodField()
+    
     class Meta:
         model = ProductImage
-        fields = ['id', 'product', 'image', 'is_primary', 'created_at']
+        fields = ['id', 'product', 'image', 'is_primary', 'srcset', 'created_at']
         read_only_fields = ['id', 'created_at']
+    
+    def get_srcset(self, obj):
+        return srcset(obj, self.context.get('request'))
 
 class ProductVariantSerializer(serializers.ModelSerializer):
+    # Availability flags only: exact counts change with every order, and
+    # this is cached with the catalog (see stock.refresh_variant_stock)
+    in_stock = serializers.BooleanField(source='stock.in_stock', read_only=True, default=False)
+    is_low_stock = serializers.BooleanField(source='stock.is_low_stock', read_only=True, default=True)
+    
     class Meta:
         model = ProductVariant
-        fields = ['id', 'product', 'size', 'price', 'sku']
+        fields = ['id', 'product', 'size', 'price', 'sku', 'in_stock', 'is_low_stock']
         read_only_fields = ['id']
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     images = ProductImageSerializer(many=True, read_only=True)
     variants = ProductVariantSerializer(many=True, read_only=True)
@@ -77,6 +133,48 @@ class ProductSerializer(serializers.ModelSerializer):
             'featured', 'created_at', 'updated_at', 'images', 'variants'
         ]
         read_only_fields = ['id', 'slug', 'created_at', 'updated_at']
+        select_related = {'category_name': ['category']}
+        prefetch_related = {'images': [PRODUCT_IMAGES], 'variants': [PRODUCT_VARIANTS]}
+
+class ProductCardImageSerializer(ProductImageSerializer):
+    class Meta(ProductImageSerializer.Meta):
+        fields = ['id', 'image', 'srcset']
+
+class ProductListSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
+    """
+    Product list card: the denormalised primary image and price range in
+    place of every nested image and variant, which ``?expand=`` can add.
+    """
+    category_name = serializers.CharField(source='category.name', read_only=True)
+    primary_image = ProductCardImageSerializer(read_only=True)
+    
+    class Meta:
+        model = Product
+        fields = [
+            'id', 'name', 'slug', 'category', 'category_name', 'price',
+            'min_price', 'max_price', 'available', 'featured', 'primary_image'
+        ]
+        read_only_fields = fields
+        expandable_fields = {
+            'images': (ProductImageSerializer, {'many': True, 'read_only': True}),
+            'variants': (ProductVariantSerializer, {'many': True, 'read_only': True}),
+        }
+        select_related = {'category_name': ['category'], 'primary_image': ['primary_image']}
+        prefetch_related = {'images': [PRODUCT_IMAGES], 'variants': [PRODUCT_VARIANTS]}
+        values_fields = {'primary_image': ['primary_image', 'primary_image__image', 'primary_image__renditions']}
+    
+    def value_primary_image(self, image_id, name, renditions):
+        # ProductCardImageSerializer's output, built from values_list() columns
+        if image_id is None:
+            return None
+        storage = ProductImage._meta.get_field('image').storage
+        request = self.context.get('request')
+        url = None
+        if name:
+            url = storage.url(name)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+        return {'id': image_id, 'image': url, 'srcset': srcset_from(renditions, storage, request)}
 
 # Inventory Serializers
 class BatchSerializer(serializers.ModelSerializer):
@@ -85,20 +183,31 @@ class BatchSerializer(serializers.ModelSerializer):
         fields = ['id', 'batch_number', 'production_date', 'expiry_date', 'notes', 'created_at']
         read_only_fields = ['id', 'created_at']
 
-class InventoryItemSerializer(serializers.ModelSerializer):
+class InventoryItemSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     product_name = serializers.CharField(source='product_variant.product.name', read_only=True)
     variant_size = serializers.CharField(source='product_variant.size', read_only=True)
     batch_number = serializers.CharField(source='batch.batch_number', read_only=True)
+    expiry_date = serializers.DateField(source='batch.expiry_date', read_only=True)
     is_low_stock = serializers.BooleanField(read_only=True)
     
     class Meta:
         model = InventoryItem
         fields = [
             'id', 'product_variant', 'product_name', 'variant_size', 
-            'batch', 'batch_number', 'quantity', 'low_stock_threshold', 
-            'is_low_stock', 'created_at', 'updated_at'
+            'batch', 'batch_number', 'expiry_date', 'quantity', 'expired_quantity',
+            'low_stock_threshold', 'is_low_stock', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'expired_quantity', 'created_at', 'updated_at']
+        select_related = {
+            'product_name': ['product_variant__product'],
+            'variant_size': ['product_variant'],
+            'batch_number': ['batch'],
+            'expiry_date': ['batch'],
+        }
+        values_fields = {'is_low_stock': ['quantity', 'low_stock_threshold']}
+    
+    def value_is_low_stock(self, quantity, low_stock_threshold):
+        return quantity <= low_stock_threshold
 
 # Order Serializers
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -111,7 +220,7 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'order', 'product_variant', 'product_name', 'variant_size', 'quantity', 'price', 'subtotal']
         read_only_fields = ['id', 'subtotal']
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     
@@ -123,9 +232,14 @@ class OrderSerializer(serializers.ModelSerializer):
             'tax', 'total', 'notes', 'created_at', 'updated_at', 'items'
         ]
         read_only_fields = ['id', 'order_number', 'created_at', 'updated_at']
+        prefetch_related = {'items': [ORDER_ITEMS]}
+
+class OrderItemCreateSerializer(serializers.Serializer):
+    product_variant = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
 
 class OrderCreateSerializer(serializers.ModelSerializer):
-    items = OrderItemSerializer(many=True)
+    items = OrderItemCreateSerializer(many=True, allow_empty=False)
     
     class Meta:
         model = Order
@@ -133,13 +247,42 @@ class OrderCreateSerializer(serializers.ModelSerializer):
             'shipping_address', 'billing_address', 'phone_number', 
             'email', 'subtotal', 'shipping_cost', 'tax', 'total', 'notes', 'items'
         ]
+        # Computed from catalog prices in create(); whatever the client sends is ignored
+        read_only_fields = ['subtotal', 'shipping_cost', 'tax', 'total']
+    
+    def validate_items(self, items):
+        # Resolve every referenced variant with a single query
+        variants = ProductVariant.objects.in_bulk({item['product_variant'] for item in items})
+        missing = sorted({item['product_variant'] for item in items} - set(variants))
+        if missing:
+            raise serializers.ValidationError(f"Invalid product variant(s): {missing}")
+        
+        for item in items:
+            item['product_variant'] = variants[item['product_variant']]
+        return items
     
     def create(self, validated_data):
         items_data = validated_data.pop('items')
-        order = Order.objects.create(user=self.context['request'].user, **validated_data)
         
-        for item_data in items_data:
-            OrderItem.objects.create(order=order, **item_data)
+        # Prices and totals always come from the catalog, never from the client
+        shipping_cost = Decimal('0.00')
+        totals = calculate_order_totals(
+            [{'quantity': item['quantity'], 'price': item['product_variant'].price} for item in items_data],
+            shipping_cost=shipping_cost,
+        )
+        order = Order.objects.create(
+            user_id=self.context['request'].user.id, shipping_cost=shipping_cost, **totals, **validated_data
+        )
+        
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product_variant=item_data['product_variant'],
+                quantity=item_data['quantity'],
+                price=item_data['product_variant'].price,
+            )
+            for item_data in items_data
+        ])
         
         return order
 
@@ -163,4 +306,21 @@ class PaymentIntentSerializer(serializers.Serializer):
 class PaymentConfirmSerializer(serializers.Serializer):
     order_id = serializers.IntegerField(required=True)
     payment_intent_id = serializers.CharField(required=True)
-    payment_method = serializers.ChoiceField(choices=Payment.PAYMENT_METHOD_CHOICES, required=True)
\ No newline at end of file
+    payment_method = serializers.ChoiceField(choices=Payment.PAYMENT_METHOD_CHOICES, required=True)
+# Analytics Serializers
+class SalesTotalsSerializer(serializers.Serializer):
+    """
+    Sales metrics with money as decimal strings, like every other amount in
+    the API. Metrics a row doesn't have (line_count for daily rows) are left
+    out.
+    """
+    order_count = serializers.IntegerField(read_only=True)
+    line_count = serializers.IntegerField(read_only=True)
+    units = serializers.IntegerField(read_only=True)
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+    average_order_value = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+
+class SalesRowSerializer(SalesTotalsSerializer):
+    def to_representation(self, instance):
+        # The grouping and label columns depend on group_by and pass through
+        return {**instance, **super().to_representation(instance)}
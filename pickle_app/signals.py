@@ -0,0 +1,100 @@
+# pickle_app/signals.py
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from .authentication import user_cache
+from .cache import bump_catalog_version
+from .models import Batch, Category, InventoryItem, Order, Product, ProductImage, ProductVariant
+from .revocation import revoke
+from .search import refresh_search_vectors
+from .stock import refresh_variant_stock
+from .summaries import refresh_product_summaries
+
+
+@receiver(post_save, sender=Product)
+def update_product_search_vector(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_search_vectors(Product.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Product)
+def update_product_summary(sender, instance, raw=False, **kwargs):
+    # The price range falls back to the product price when there are no variants
+    if not raw:
+        refresh_product_summaries(Product.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Category)
+def update_category_search_vectors(sender, instance, created, raw=False, **kwargs):
+    # The category name is part of every product's search document
+    if not (raw or created):
+        refresh_search_vectors(instance.products.all())
+
+
+@receiver([post_save, post_delete], sender=ProductVariant)
+@receiver([post_save, post_delete], sender=ProductImage)
+def touch_product(sender, instance, raw=False, **kwargs):
+    # Keep Product.updated_at a valid ETag/Last-Modified source for nested
+    # data, and the primary image and price range in step with it
+    if not raw:
+        refresh_product_summaries(Product.objects.filter(pk=instance.product_id), updated_at=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=ProductVariant)
+@receiver([post_save, post_delete], sender=ProductImage)
+def invalidate_catalog_cache(sender, **kwargs):
+    # Wait for the commit so a concurrent read can't cache the old rows
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver([post_save, post_delete], sender=InventoryItem)
+def update_variant_stock(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_variant_stock([instance.product_variant_id])
+
+
+@receiver(post_save, sender=ProductVariant)
+def create_variant_stock(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        refresh_variant_stock([instance.pk])
+
+
+@receiver(post_save, sender=Batch)
+def update_batch_variant_stock(sender, instance, created, raw=False, **kwargs):
+    # A changed expiry date can change each variant's earliest batch
+    if not (raw or created):
+        refresh_variant_stock(instance.inventory_items.values_list('product_variant_id', flat=True))
+
+
+@receiver([post_save, post_delete], sender=get_user_model())
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_cache.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def add_revoked_token(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        revoke(instance.token.jti)
+
+
+@receiver(post_delete, sender=Order)
+def update_deleted_order_rollups(sender, instance, **kwargs):
+    # Deleted orders leave no updated_at behind for the incremental refresh
+    from .tasks import update_sales_rollups
+    day = timezone.localdate(instance.created_at).isoformat()
+    transaction.on_commit(lambda: update_sales_rollups.delay([day]))
+
+
+@receiver(post_save, sender=ProductImage)
+def queue_image_renditions(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Saving the renditions themselves must not queue another run
+    if raw or (update_fields and 'image' not in update_fields):
+        return
+    from .tasks import render_product_image
+    transaction.on_commit(lambda: render_product_image.delay(instance.pk))
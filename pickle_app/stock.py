@@ -0,0 +1,206 @@
+# pickle_app/stock.py
+import datetime
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cache import bump_catalog_version
+from .models import InventoryItem, Product, ProductVariant, VariantStock
+
+DEFAULT_LOW_STOCK_THRESHOLD = InventoryItem._meta.get_field('low_stock_threshold').default
+
+# Matches the inventory_low_stock_idx partial index
+LOW_STOCK = Q(quantity__lte=F('low_stock_threshold'))
+
+LOW_STOCK_GROUPS = {
+    'variant': {
+        'variant_id': F('product_variant_id'),
+        'sku': F('product_variant__sku'),
+        'variant_size': F('product_variant__size'),
+        'product_id': F('product_variant__product_id'),
+        'product_name': F('product_variant__product__name'),
+    },
+    'product': {
+        'product_id': F('product_variant__product_id'),
+        'product_name': F('product_variant__product__name'),
+    },
+}
+
+
+def refresh_variant_stock(variant_ids):
+    """
+    Recompute the VariantStock summary for the given variants.
+
+    Totals for every variant are computed in one aggregate query and only the
+    summaries that actually changed are written back with one upsert.
+
+    The catalog only shows availability flags, so most changes (an order
+    taking a few units) leave it alone. Only when a variant goes in or out
+    of stock, or crosses its low-stock threshold, is its product touched
+    and the catalog version bumped.
+    """
+    variant_ids = set(variant_ids)
+    if not variant_ids:
+        return
+
+    today = timezone.localdate()
+    # Expired batches stop counting as soon as the day turns, before
+    # expire_stock() writes them off
+    in_date = Q(inventory__batch__expiry_date__gte=today)
+    earliest_batch = (
+        InventoryItem.objects
+        .filter(product_variant=OuterRef('pk'), quantity__gt=0, batch__expiry_date__gte=today)
+        .order_by('batch__expiry_date', 'id')
+        .values('batch_id')[:1]
+    )
+    rows = (
+        ProductVariant.objects
+        .filter(pk__in=variant_ids)
+        .annotate(
+            total=Coalesce(Sum('inventory__quantity', filter=in_date), 0),
+            threshold=Coalesce(Max('inventory__low_stock_threshold'), DEFAULT_LOW_STOCK_THRESHOLD),
+            earliest_batch_id=Subquery(earliest_batch),
+        )
+        .values_list('pk', 'product_id', 'total', 'threshold', 'earliest_batch_id')
+    )
+
+    with transaction.atomic():
+        current = VariantStock.objects.in_bulk(variant_ids)
+        changed = []
+        product_ids = set()  # Products whose availability changed
+        for variant_id, product_id, total, threshold, batch_id in rows:
+            summary = VariantStock(
+                product_variant_id=variant_id,
+                on_hand=total,
+                low_stock_threshold=threshold,
+                is_low_stock=total <= threshold,
+                earliest_batch_id=batch_id,
+            )
+            existing = current.get(variant_id) or VariantStock()
+            if existing.pk and (
+                existing.on_hand, existing.low_stock_threshold, existing.earliest_batch_id
+            ) == (total, threshold, batch_id):
+                continue
+            changed.append(summary)
+            if (existing.in_stock, existing.is_low_stock) != (summary.in_stock, summary.is_low_stock):
+                product_ids.add(product_id)
+
+        if not changed:
+            return
+
+        VariantStock.objects.bulk_create(
+            changed,
+            update_conflicts=True,
+            unique_fields=['product_variant'],
+            update_fields=['on_hand', 'low_stock_threshold', 'is_low_stock', 'earliest_batch', 'updated_at'],
+        )
+        if product_ids:
+            Product.objects.filter(pk__in=product_ids).update(updated_at=timezone.now())
+            transaction.on_commit(bump_catalog_version)
+
+
+def expire_stock(today=None, batch_size=1000):
+    """
+    Write off the remaining stock of every batch that expired before
+    ``today``: ``quantity`` moves into ``expired_quantity`` with one UPDATE
+    per ``batch_size`` rows, and the affected VariantStock summaries are
+    refreshed.
+
+    Expired batches are found through batch_expiry_id_idx and rows already
+    at zero are skipped, so a run only touches stock that expired since the
+    last one. Returns ``(rows, units)`` written off.
+    """
+    today = today or timezone.localdate()
+    expired = InventoryItem.objects.filter(
+        quantity__gt=0, batch__expiry_date__lt=today
+    ).order_by('pk')
+
+    rows = units = 0
+    while True:
+        # Short transactions keep allocation waiting on at most one chunk
+        with transaction.atomic():
+            items = list(
+                expired.select_for_update(of=('self',))
+                .values_list('pk', 'product_variant_id', 'quantity')[:batch_size]
+            )
+            if not items:
+                break
+            InventoryItem.objects.filter(pk__in=[pk for pk, _, _ in items]).update(
+                expired_quantity=F('expired_quantity') + F('quantity'),
+                quantity=0,
+                updated_at=timezone.now(),
+            )
+            refresh_variant_stock(variant_id for _, variant_id, _ in items)
+        rows += len(items)
+        units += sum(quantity for _, _, quantity in items)
+    return rows, units
+
+
+def expiring_items(days, today=None):
+    """
+    In-stock inventory rows whose batch expires within ``days`` days of
+    ``today`` (inclusive), with the expiry date annotated for keyset
+    pagination. The date range is served by batch_expiry_id_idx.
+    """
+    today = today or timezone.localdate()
+    return (
+        InventoryItem.objects
+        .filter(
+            quantity__gt=0,
+            batch__expiry_date__gte=today,
+            batch__expiry_date__lte=today + datetime.timedelta(days=days),
+        )
+        .annotate(expiry_date=F('batch__expiry_date'))
+        .select_related('product_variant__product', 'batch')
+    )
+
+
+def low_stock_rows(today=None):
+    """
+    In-date inventory rows at or below their low-stock threshold. Expired
+    batches are left out: their stock is written off (or about to be) by
+    expire_stock(), not waiting to be reordered.
+    """
+    today = today or timezone.localdate()
+    return InventoryItem.objects.filter(LOW_STOCK, batch__expiry_date__gte=today)
+
+
+def low_stock_items():
+    """
+    Low-stock rows joined to their variant, product and batch in a single
+    query.
+    """
+    return low_stock_rows().select_related('product_variant__product', 'batch')
+
+
+def low_stock_groups(group_by):
+    """
+    Low-stock rows aggregated per variant or per product.
+    ``group_by`` must be one of LOW_STOCK_GROUPS.
+    """
+    columns = LOW_STOCK_GROUPS[group_by]
+    return (
+        low_stock_rows()
+        .values(**columns)
+        .annotate(
+            items=Count('id'),
+            batches=Count('batch', distinct=True),
+            total_quantity=Sum('quantity'),
+            min_quantity=Min('quantity'),
+        )
+        .order_by(next(iter(columns)))
+    )
+
+
+def low_stock_summary():
+    """
+    Totals across all low-stock rows.
+    """
+    return low_stock_rows().aggregate(
+        items=Count('id'),
+        variants=Count('product_variant', distinct=True),
+        products=Count('product_variant__product', distinct=True),
+        total_quantity=Coalesce(Sum('quantity'), 0),
+    )
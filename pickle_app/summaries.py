@@ -0,0 +1,28 @@
+# pickle_app/summaries.py
+from django.db.models import F, Max, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import ProductImage, ProductVariant
+
+
+def refresh_product_summaries(queryset, **fields):
+    """
+    Recompute the denormalised list-card fields of the given products with
+    one UPDATE: ``primary_image`` (the first image flagged primary, else the
+    first image) and ``min_price``/``max_price`` over the variants, falling
+    back to the product's own price when it has none. Extra ``fields`` are
+    written in the same statement.
+    """
+    primary_image = (
+        ProductImage.objects
+        .filter(product=OuterRef('pk'))
+        .order_by('-is_primary', 'id')
+        .values('pk')[:1]
+    )
+    variants = ProductVariant.objects.filter(product=OuterRef('pk')).order_by().values('product')
+    queryset.update(
+        primary_image=Subquery(primary_image),
+        min_price=Coalesce(Subquery(variants.annotate(low=Min('price')).values('low')), F('price')),
+        max_price=Coalesce(Subquery(variants.annotate(high=Max('price')).values('high')), F('price')),
+        **fields,
+    )
@@ -0,0 +1,123 @@
+# pickle_app/tasks.py
+import datetime
+from smtplib import SMTPException
+
+from celery import shared_task
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import send_mass_mail
+from django.db import IntegrityError, OperationalError, transaction
+from django.utils import timezone
+
+from .allocation import allocate_order_items, flag_stockouts
+from .analytics import refresh_sales_rollups
+from .models import Order, ProductImage
+from .renditions import generate_renditions
+from .stock import expire_stock
+
+User = get_user_model()
+
+
+@shared_task(autoretry_for=(OperationalError,), retry_backoff=True, max_retries=5)
+def process_order(order_id):
+    """
+    Allocate stock for a newly placed order and flag any stockouts, then fan
+    out notifications.
+
+    Idempotent: the order row is locked and ``stock_allocated_at`` records that
+    allocation already happened, so redelivered or retried tasks are no-ops.
+    Orders cancelled before the task ran are skipped.
+    """
+    with transaction.atomic():
+        order = Order.objects.select_for_update().filter(pk=order_id).first()
+        if order is None or order.stock_allocated_at or order.status == 'CANCELLED':
+            return
+
+        items = order.items.select_related('product_variant__product').order_by('pk')
+        allocations, shortages = allocate_order_items(items)
+
+        flag_stockouts(order, shortages)
+        order.stock_allocated_at = timezone.now()
+        order.save(update_fields=['notes', 'stock_allocated_at', 'updated_at'])
+
+        transaction.on_commit(
+            lambda: send_order_notifications.delay(order_id, stockout=bool(shortages))
+        )
+
+
+@shared_task(autoretry_for=(SMTPException, ConnectionError), retry_backoff=True, max_retries=5)
+def send_order_notifications(order_id, stockout=False):
+    """
+    Email the order confirmation to the customer and, if the order could not
+    be fully allocated, a stockout alert to staff.
+
+    Idempotent: the order is claimed by setting ``notified_at`` in a single
+    UPDATE before anything is sent, so no row lock is held while talking to
+    SMTP and a concurrent or repeated run finds nothing to do. A failed send
+    releases the claim, so the retry tries again.
+    """
+    now = timezone.now()
+    if not Order.objects.filter(pk=order_id, notified_at__isnull=True).update(notified_at=now, updated_at=now):
+        return
+
+    try:
+        order = Order.objects.get(pk=order_id)
+        messages = [(
+            f"Order {order.order_number} received",
+            f"Thank you for your order! Your order number is {order.order_number} "
+            f"and your total is {order.total}.",
+            settings.DEFAULT_FROM_EMAIL,
+            [order.email],
+        )]
+        if stockout:
+            staff_emails = list(
+                User.objects.filter(role__in=['ADMIN', 'STAFF'], is_active=True).values_list('email', flat=True)
+            )
+            if staff_emails:
+                messages.append((
+                    f"Stockout on order {order.order_number}",
+                    f"Order {order.order_number} could not be fully allocated and needs review.\n\n{order.notes}",
+                    settings.DEFAULT_FROM_EMAIL,
+                    staff_emails,
+                ))
+
+        send_mass_mail(messages)
+    except Exception:
+        Order.objects.filter(pk=order_id, notified_at=now).update(notified_at=None)
+        raise
+
+
+@shared_task(autoretry_for=(OperationalError, IntegrityError), retry_backoff=True, max_retries=5)
+def update_sales_rollups(days=None):
+    """
+    Refresh the daily sales rollups. Runs on the beat schedule
+    (CELERY_BEAT_SCHEDULE) and for specific ISO ``days`` after deletes.
+    """
+    if days is not None:
+        days = [datetime.date.fromisoformat(day) for day in days]
+    return refresh_sales_rollups(days)
+
+
+@shared_task(autoretry_for=(OperationalError,), retry_backoff=True, max_retries=5)
+def sweep_expired_stock():
+    """
+    Write off inventory in batches that have expired. Runs daily on the
+    beat schedule (CELERY_BEAT_SCHEDULE); safe to rerun.
+    """
+    rows, units = expire_stock()
+    return {'items': rows, 'units': units}
+
+
+@shared_task(autoretry_for=(OperationalError, OSError), retry_backoff=True, max_retries=5)
+def render_product_image(image_id, force=False):
+    """
+    Generate the resized renditions of a product image after its upload has
+    been committed. Unless ``force`` is set, skipped when the renditions
+    already match the current file, so repeated saves cost one query.
+    """
+    image = ProductImage.objects.filter(pk=image_id).first()
+    if image is None or not image.image:
+        return
+    if not force and image.renditions.get('source') == image.image.name:
+        return
+    generate_renditions(image)
@@ -1,3 +1,1346 @@
-from django.test import TestCase
+# pickle_app/tests.py
+import csv
+import io
+import json
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from smtplib import SMTPException
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from celery.exceptions import Retry
+from django.core import mail
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from django.utils.translation import gettext_lazy
+from PIL import Image
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import async_views
+from .analytics import SALES_CHECKPOINT, refresh_sales_rollups
+from .cache import CATALOG_VERSION_KEY, get_catalog_version
+from .fastjson import FastJSONParser, FastJSONRenderer
+from .fastpath import ValuesPlan
+from .models import (
+    Batch, Category, DailySales, InventoryItem, Order, OrderItemAllocation, Payment, Product, ProductImage,
+    ProductVariant, RollupCheckpoint, User
+)
+from .pagination import KeysetPagination
+from .renditions import rendition_paths
+from .revocation import LocalRevocationFilter, RedisRevocationFilter, RevocationFilter
+from .search import ProductSearchFilter, refresh_search_vectors
+from .stock import expire_stock
+from .tasks import process_order, render_product_image, send_order_notifications, sweep_expired_stock
+from .views import CategoryViewSet, HomeView, InventoryViewSet, ProductViewSet, SearchView
+
+
+def create_products(category, count, prefix='Product', **fields):
+    products = Product.objects.bulk_create(
+        Product(
+            name=f'{prefix} {i}', slug=f'{prefix.lower()}-{i}', category=category,
+            description='Homemade pickle', ingredients='Salt, oil', price=Decimal('100.00') + i % 50,
+            **fields
+        )
+        for i in range(count)
+    )
+    refresh_search_vectors(Product.objects.filter(pk__in=[product.pk for product in products]))
+    return products
+
+
+def create_orders(user, count):
+    # Mostly delivered, like a real order history
+    return Order.objects.bulk_create(
+        Order(
+            user=user, order_number=f'ORD-{user.pk}-{i}', status='PENDING' if i % 50 == 0 else 'DELIVERED',
+            shipping_address='1 Main St', billing_address='1 Main St', phone_number='555', email=user.email,
+            subtotal=Decimal(i % 7), shipping_cost=0, tax=0, total=Decimal(i % 7),
+        )
+        for i in range(count)
+    )
+
+
+def place_order(testcase, user, lines, **fields):
+    """POST an order for ``lines`` of ``(variant, quantity)`` and run its tasks."""
+    client = APIClient()
+    client.force_authenticate(user)
+    with testcase.captureOnCommitCallbacks(execute=True):
+        response = client.post('/api/orders/', {
+            'shipping_address': '1 Main St', 'billing_address': '1 Main St', 'phone_number': '555',
+            'email': user.email, **fields,
+            'items': [{'product_variant': variant.pk, 'quantity': quantity} for variant, quantity in lines],
+        }, format='json')
+    testcase.assertEqual(response.status_code, 201, response.content)
+    return Order.objects.get(pk=response.json()['id'])
+
+
+def analyze():
+    # What autovacuum does in production: merge GIN pending lists into the
+    # index proper, then refresh the planner statistics
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT gin_clean_pending_list(i.indexrelid::regclass) FROM pg_index i "
+            "JOIN pg_class c ON c.oid = i.indexrelid JOIN pg_am am ON am.oid = c.relam "
+            "WHERE am.amname = 'gin'"
+        )
+        cursor.execute('ANALYZE')
+
+
+def add_variants_and_images(product, count):
+    for i in range(count):
+        n = product.variants.count()
+        ProductVariant.objects.create(product=product, size=f'Size {n}', price=5 + n, sku=f'{product.slug}-{n}')
+        ProductImage.objects.create(product=product, image=f'products/{product.slug}-{n}.jpg', is_primary=n == 0)
+
+
+class ProductQueryCountTests(TestCase):
+    """Product endpoints run the same number of queries however much they return."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Pickles', slug='pickles')
+
+    def get(self, path, params=None):
+        cache.clear()
+        response = APIClient().get(path, params, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_list(self):
+        product, = create_products(self.category, 1, prefix='First')
+        add_variants_and_images(product, 1)
+        for product in create_products(self.category, 9):
+            add_variants_and_images(product, 3)
+
+        # Count, page, and for expanded fields one prefetch each; plus the catalog Last-Modified
+        for params, queries in [(None, 3), ({'expand': 'variants,images'}, 5)]:
+            with self.subTest(params=params), self.assertNumQueries(queries):
+                self.assertEqual(len(self.get('/api/products/', params).json()['results']), 10)
+            with self.subTest(params=params, search='First'), self.assertNumQueries(queries):
+                self.get('/api/products/', {**(params or {}), 'search': 'First'})
+
+    def test_detail(self):
+        product, = create_products(self.category, 1)
+        add_variants_and_images(product, 1)
+        # The product with its category, its variants with stock, its images; plus Last-Modified
+        with self.assertNumQueries(4):
+            self.get('/api/products/product-0/')
+
+        add_variants_and_images(product, 4)
+        with self.assertNumQueries(4):
+            self.assertEqual(len(self.get('/api/products/product-0/').json()['variants']), 5)
+
+    def test_fields_drop_prefetches(self):
+        product, = create_products(self.category, 1)
+        add_variants_and_images(product, 3)
+        detail = '/api/products/product-0/'
+        # Only the selected relations are prefetched; plus Last-Modified
+        for params, queries in [({'fields': 'id,name'}, 2), ({'fields': 'id,name,variants'}, 3), (None, 4)]:
+            with self.subTest(params=params):
+                with CaptureQueriesContext(connection) as captured, self.assertNumQueries(queries):
+                    data = self.get(detail, params).json()
+                sql = ' '.join(query['sql'] for query in captured)
+                for field, model in [('images', ProductImage), ('variants', ProductVariant)]:
+                    self.assertEqual(model._meta.db_table in sql, field in data)
+
+        with self.assertNumQueries(3):
+            product, = self.get('/api/products/', {'fields': 'id,name'}).json()['results']
+        self.assertEqual(set(product), {'id', 'name'})
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Pickles', slug='pickles')
+        create_products(cls.category, 20)
+        create_products(cls.category, 1, prefix='Mango')
+
+    def search(self, term):
+        response = APIClient().get('/api/search/', {'search': term}, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        return [product['name'] for product in response.json()['results']]
+
+    def test_finds_products_by_name(self):
+        self.assertEqual(self.search('mango'), ['Mango 0'])
+
+    def test_no_match(self):
+        self.assertEqual(self.search('lemon'), [])
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Pickles', slug='pickles')
+        create_products(cls.category, 3)
+        cls.staff = User.objects.create_user('staff', 'staff@example.com', 'pw', role='STAFF')
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, path, **headers):
+        return APIClient().get(path, HTTP_ACCEPT='application/json', **headers)
+
+    def test_write_bumps_version_and_invalidates_cached_list(self):
+        self.assertEqual(self.get('/api/products/').json()['count'], 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get('/api/products/').json()['count'], 3)
+        version = get_catalog_version()
+
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.patch('/api/products/product-1/', {'name': 'Lime Pickle'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        self.assertNotEqual(get_catalog_version(), version)
+        names = {product['name'] for product in self.get('/api/products/').json()['results']}
+        self.assertIn('Lime Pickle', names)
+
+    def test_not_modified_only_for_current_etag(self):
+        path = '/api/products/'
+        response = self.get(path)
+        etag = response['ETag']
+        self.assertEqual(self.get(path, HTTP_IF_NONE_MATCH=f'"other", {etag}').status_code, 304)
+        self.assertEqual(self.get(path, HTTP_IF_NONE_MATCH='*').status_code, 304)
+        self.assertEqual(self.get(path, HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+        # Each URL has its own ETag
+        self.assertEqual(self.get(f'{path}?ordering=-price', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.get(slug='product-2').save()
+        response = self.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.get(path, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_not_modified_without_queries(self):
+        for path in ['/api/products/', '/api/products/product-1/', '/api/products/categories/']:
+            etag = self.get(path)['ETag']
+            with self.assertNumQueries(0):
+                response = self.get(path, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response['ETag'], etag)
+
+    def test_category_rename_changes_etag(self):
+        response = self.get('/api/products/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = 'Chutneys'
+            self.category.save()
+
+        response = self.get('/api/products/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({product['category_name'] for product in response.json()['results']}, {'Chutneys'})
+
+    def test_last_modified_includes_category(self):
+        Product.objects.update(updated_at=timezone.now() - timedelta(days=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.save()
+        response = self.get('/api/products/')
+        self.category.refresh_from_db()
+        self.assertEqual(response['Last-Modified'], http_date(self.category.updated_at.timestamp()))
+
+
+class AsyncCatalogTests(TestCase):
+    """The async read path answers exactly like the viewsets it stands in for."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Pickles', slug='pickles')
+        create_products(cls.category, 25)
+
+    def setUp(self):
+        cache.clear()
+
+    def assertSameResponse(self, async_view, sync_view, path, params=None, **kwargs):
+        headers = {key: value for key, value in kwargs.items() if key.startswith('HTTP_')}
+        kwargs = {key: value for key, value in kwargs.items() if key not in headers}
+        factory = APIRequestFactory()
+        sync_response = sync_view(factory.get(path, params, HTTP_ACCEPT='application/json', **headers), **kwargs)
+        sync_response.render()
+        # Drop the cached payloads, but keep the catalog version the ETag is built from
+        version = get_catalog_version()
+        cache.clear()
+        cache.set(CATALOG_VERSION_KEY, version, None)
+        async_response = async_to_sync(async_view)(
+            factory.get(path, params, HTTP_ACCEPT='application/json', **headers), **kwargs
+        )
+
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        self.assertEqual(async_response.content, sync_response.content)
+        self.assertEqual(dict(async_response.items()), dict(sync_response.items()))
+        return async_response
+
+    def assertSameProducts(self, params=None, **headers):
+        return self.assertSameResponse(
+            async_views.product_list, ProductViewSet.as_view(async_views.LIST_ACTIONS), '/api/products/',
+            params, **headers
+        )
+
+    def test_product_list(self):
+        self.assertSameProducts()
+        self.assertSameProducts({'page': 2, 'ordering': '-price'})
+        self.assertSameProducts({'page': 'last', 'fields': 'name,price'})
+        self.assertSameProducts({'fields': 'name,variants', 'expand': 'images'})
+
+    def test_bad_pages(self):
+        for page in [99, 'abc', 0]:
+            response = self.assertSameProducts({'page': page})
+            self.assertEqual(response.status_code, 404)
+
+    def test_bad_fields(self):
+        response = self.assertSameProducts({'fields': 'name,secret'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_not_modified(self):
+        etag = self.assertSameProducts()['ETag']
+        response = self.assertSameProducts(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_product_detail(self):
+        view = ProductViewSet.as_view(async_views.DETAIL_ACTIONS)
+        self.assertSameResponse(async_views.product_detail, view, '/api/products/product-1/', slug='product-1')
+        response = self.assertSameResponse(async_views.product_detail, view, '/api/products/nope/', slug='nope')
+        self.assertEqual(response.status_code, 404)
+
+    def test_categories(self):
+        self.assertSameResponse(
+            async_views.category_list, CategoryViewSet.as_view(async_views.LIST_ACTIONS), '/api/products/categories/'
+        )
+        self.assertSameResponse(
+            async_views.category_detail, CategoryViewSet.as_view(async_views.DETAIL_ACTIONS),
+            '/api/products/categories/pickles/', slug='pickles'
+        )
+
+    def test_search(self):
+        view = SearchView.as_view()
+        self.assertSameResponse(async_views.search_view, view, '/api/search/', {'search': 'product', 'page': 2})
+        response = self.assertSameResponse(async_views.search_view, view, '/api/search/', {'page': 'abc'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_home(self):
+        self.assertSameResponse(async_views.home_view, HomeView.as_view(), '/api/')
+
+
+class FastPathTests(TestCase):
+    """Lists served from values_list() rows match the serializers' output, page by page."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', 'staff@example.com', 'pw', role='STAFF')
+        products = create_products(Category.objects.create(name='Pickles', slug='pickles'), 15)
+        today = timezone.localdate()
+        batches = [
+            Batch.objects.create(production_date=today, expiry_date=today + timedelta(days=days)) for days in (30, 60)
+        ]
+        for i, product in enumerate(products):
+            Product.objects.filter(pk=product.pk).update(created_at=timezone.now() - timedelta(minutes=i))
+            if i % 3:
+                ProductImage.objects.create(product=product, image=f'products/{i}.jpg', is_primary=True)
+            variant = ProductVariant.objects.create(product=product, size='Small', price=5 + i, sku=f'P-{i}')
+            for batch in batches:
+                InventoryItem.objects.create(product_variant=variant, batch=batch, quantity=i % 4 * 5)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def pages(self, url, params):
+        # Every page forward, then back again from the last one
+        response = self.client.get(url, params, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        pages = [response.json()]
+        for direction in ('next', 'previous'):
+            while pages[-1].get(direction):
+                cache.clear()
+                pages.append(self.client.get(pages[-1][direction], HTTP_ACCEPT='application/json').json())
+        return pages
+
+    def assertSameLists(self, view_class, url, *cases):
+        with mock.patch.object(ValuesPlan, 'represent', autospec=True, side_effect=ValuesPlan.represent) as represent:
+            for params in cases:
+                with self.subTest(url=url, **params):
+                    fast = self.pages(url, params)
+                    cache.clear()
+                    with mock.patch.object(view_class, 'use_values_list', False):
+                        slow = self.pages(url, params)
+                    self.assertGreater(len(fast), 2)
+                    self.assertEqual(fast, slow)
+        self.assertTrue(represent.called)
+
+    def test_products(self):
+        self.assertSameLists(
+            ProductViewSet, '/api/products/',
+            {}, {'ordering': 'name'}, {'fields': 'id,name,price,primary_image'},
+            {'fields': 'name,variants', 'expand': 'images'},
+        )
+
+    def test_search(self):
+        self.assertSameLists(
+            SearchView, '/api/search/',
+            {'search': 'product', 'sort_by': 'name'}, {'sort_by': 'newest', 'fields': 'id,slug,min_price,max_price'},
+        )
+
+    def test_inventory(self):
+        self.assertSameLists(
+            InventoryViewSet, '/api/inventory/',
+            {}, {'ordering': 'quantity'}, {'ordering': '-quantity', 'fields': 'id,product_name,quantity,is_low_stock'},
+        )
+
+
+class FastJSONTests(TestCase):
+    """FastJSONRenderer and FastJSONParser give the stdlib ones' results."""
+    def assertSameRendering(self, data, media_type=None):
+        self.assertEqual(FastJSONRenderer().render(data, media_type), JSONRenderer().render(data, media_type))
+
+    def assertSameParse(self, body):
+        parse = lambda parser: parser.parse(io.BytesIO(body), parser_context={})
+        try:
+            expected = parse(JSONParser())
+        except ParseError as exc:
+            with self.assertRaisesMessage(ParseError, str(exc.detail)):
+                parse(FastJSONParser())
+        else:
+            self.assertEqual(parse(FastJSONParser()), expected)
+
+    def test_renderer(self):
+        now = timezone.now()
+        data = {
+            'decimal': Decimal('12.50'), 'big': 2 ** 70, 'negative': -(2 ** 63), 'none': None, 'flags': (True, False),
+            'aware': now, 'naive': datetime(2024, 1, 2, 3, 4, 5, 678901), 'date': date(2024, 1, 2), 'time': now.time(),
+            'duration': timedelta(days=1, seconds=5), 'uuid': uuid.uuid4(), 'lazy': gettext_lazy('Token is blacklisted'),
+            'text': 'Ünïcode, \u2028line\u2029 separators, "quotes" and </script>', 'nested': [{'a': [1, {'b': []}]}],
+        }
+        self.assertSameRendering(data)
+        self.assertSameRendering([data, data])
+        self.assertSameRendering({1: 'non-string key'})
+        self.assertSameRendering(data, 'application/json; indent=4')
+        self.assertSameRendering(None)
+
+    def test_renderer_rejects_non_finite_decimals(self):
+        for value in [Decimal('NaN'), Decimal('Infinity')]:
+            with self.assertRaises(ValueError):
+                JSONRenderer().render({'value': value})
+            with self.assertRaises(ValueError):
+                FastJSONRenderer().render({'value': value})
+
+    def test_renderer_writes_non_finite_floats_as_null(self):
+        # See FastJSONRenderer: no serializer here outputs floats
+        self.assertEqual(FastJSONRenderer().render({'value': float('nan')}), b'{"value":null}')
+
+    def test_parser(self):
+        for body in [
+            b'{"items": [{"product_variant": 1, "quantity": 2}], "total": "12.50", "ok": true, "none": null}',
+            b'[1.5, -0.0, 1e16, "\\u00e9\\u2028", "\xc3\xa9"]',
+            b'{"big": 123456789012345678901234567890, "id": "1234567890123456789012"}',
+            b'{"nan": NaN}', b'{"trailing": 1,}', b'', b'"\\ud800"',
+        ]:
+            with self.subTest(body=body):
+                self.assertSameParse(body)
+
+
+class ProductSummaryTests(TestCase):
+    """The list card's price range and primary image follow variant and image changes."""
+    def setUp(self):
+        self.product = Product.objects.create(
+            name='Mango Pickle', slug='mango', category=Category.objects.create(name='Pickles', slug='pickles'),
+            description='Homemade pickle', ingredients='Salt, oil', price=100,
+        )
+
+    def summary(self):
+        self.product.refresh_from_db()
+        return self.product.min_price, self.product.max_price, self.product.primary_image_id
+
+    def test_price_range_follows_variants(self):
+        self.assertEqual(self.summary(), (Decimal('100.00'), Decimal('100.00'), None))
+        small = ProductVariant.objects.create(product=self.product, size='Small', price=5, sku='P-S')
+        large = ProductVariant.objects.create(product=self.product, size='Large', price=9, sku='P-L')
+        self.assertEqual(self.summary()[:2], (Decimal('5.00'), Decimal('9.00')))
+
+        large.price = 12
+        large.save()
+        self.assertEqual(self.summary()[:2], (Decimal('5.00'), Decimal('12.00')))
+        small.delete()
+        self.assertEqual(self.summary()[:2], (Decimal('12.00'), Decimal('12.00')))
+
+        # Without variants the range is the product's own price
+        large.delete()
+        self.product.price = 80
+        self.product.save()
+        self.assertEqual(self.summary()[:2], (Decimal('80.00'), Decimal('80.00')))
+
+    def test_primary_image_follows_images(self):
+        first = ProductImage.objects.create(product=self.product, image='products/first.jpg')
+        self.assertEqual(self.summary()[2], first.pk)
+        primary = ProductImage.objects.create(product=self.product, image='products/primary.jpg', is_primary=True)
+        self.assertEqual(self.summary()[2], primary.pk)
+
+        primary.is_primary = False
+        primary.save()
+        self.assertEqual(self.summary()[2], first.pk)
+        first.delete()
+        self.assertEqual(self.summary()[2], primary.pk)
+        primary.delete()
+        self.assertIsNone(self.summary()[2])
+
+
+class RenditionTests(TestCase):
+    """Uploads are resized after commit and listed in srcsets with absolute URLs."""
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media = self.settings(MEDIA_ROOT=directory.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.product, = create_products(Category.objects.create(name='Pickles', slug='pickles'), 1)
+
+    def upload(self, width, height):
+        buffer = io.BytesIO()
+        Image.new('RGB', (width, height), 'green').save(buffer, 'JPEG')
+        with self.captureOnCommitCallbacks(execute=True):
+            return ProductImage.objects.create(
+                product=self.product, is_primary=True,
+                image=SimpleUploadedFile('mango.jpg', buffer.getvalue(), content_type='image/jpeg'),
+            )
+
+    def test_renditions_are_generated_and_replaced(self):
+        image = self.upload(1000, 600)
+        image.refresh_from_db()
+        sizes = image.renditions['sizes']
+        self.assertEqual(
+            {name: (size['width'], size['height']) for name, size in sizes.items()},
+            {'zoom': (1000, 600), 'card': (480, 288), 'thumbnail': (160, 96)},
+        )
+        paths = rendition_paths(image.renditions)
+        self.assertEqual(len(paths), 6)
+        self.assertTrue(all(default_storage.exists(path) for path in paths))
+
+        render_product_image.delay(image.pk, force=True)
+        image.refresh_from_db()
+        self.assertTrue(all(default_storage.exists(path) for path in rendition_paths(image.renditions)))
+        self.assertFalse(any(default_storage.exists(path) for path in paths - rendition_paths(image.renditions)))
+
+    def test_srcset_urls_are_absolute(self):
+        image = self.upload(300, 300)  # Smaller than the card size: no upscaling, one width fewer
+        image.refresh_from_db()
+        thumbnail = image.renditions['sizes']['thumbnail']['webp']
+        card = image.renditions['sizes']['card']['webp']
+        expected = f'http://testserver/media/{thumbnail} 160w, http://testserver/media/{card} 300w'
+
+        client = APIClient()
+        detail = client.get(f'/api/products/{self.product.slug}/', HTTP_ACCEPT='application/json').json()
+        self.assertEqual(detail['images'][0]['srcset']['webp'], expected)
+        self.assertEqual(detail['images'][0]['image'], f'http://testserver/media/{image.image.name}')
+
+        for params in [{}, {'expand': 'images'}]:
+            listed, = client.get('/api/products/', params, HTTP_ACCEPT='application/json').json()['results']
+            self.assertEqual(listed['primary_image']['srcset']['webp'], expected)
+
+
+class VariantStockTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Pickles', slug='pickles')
+        self.product, = create_products(category, 1)
+        self.variant = ProductVariant.objects.create(product=self.product, size='Small', price=5, sku='P-S')
+        batch = Batch.objects.create(
+            production_date=timezone.localdate(), expiry_date=timezone.localdate() + timedelta(days=90)
+        )
+        self.item = InventoryItem(product_variant=self.variant, batch=batch, quantity=0, low_stock_threshold=10)
+
+    def set_quantity(self, quantity):
+        # Returns whether the change invalidated the catalog
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.quantity = quantity
+            self.item.save()
+        self.variant.stock.refresh_from_db()
+        return get_catalog_version() != version
+
+    def test_catalog_changes_only_with_availability(self):
+        self.assertTrue(self.set_quantity(50))  # In stock
+        self.assertFalse(self.set_quantity(40))
+        self.assertEqual(self.variant.stock.on_hand, 40)
+        self.assertTrue(self.set_quantity(5))  # Low stock
+        self.assertFalse(self.set_quantity(4))
+        self.assertTrue(self.set_quantity(0))  # Out of stock
+
+    def test_catalog_shows_availability_not_counts(self):
+        self.set_quantity(40)
+        response = APIClient().get(f'/api/products/{self.product.slug}/', HTTP_ACCEPT='application/json')
+        variant, = response.json()['variants']
+        self.assertEqual(
+            {key: variant[key] for key in ('in_stock', 'is_low_stock')}, {'in_stock': True, 'is_low_stock': False}
+        )
+        self.assertNotIn('on_hand', variant)
+
+
+class LowStockReportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', 'staff@example.com', 'pw', role='STAFF')
+        product, = create_products(Category.objects.create(name='Pickles', slug='pickles'), 1)
+        variant = ProductVariant.objects.create(product=product, size='Small', price=5, sku='P-S')
+        today = timezone.localdate()
+        for days, quantity in [(30, 3), (-10, 2), (-1, 4)]:
+            batch = Batch.objects.create(production_date=today - timedelta(days=60), expiry_date=today + timedelta(days=days))
+            item = InventoryItem.objects.create(product_variant=variant, batch=batch, quantity=quantity)
+            if days == 30:
+                cls.in_date = item
+        # Writes off the batch that expired ten days ago; yesterday's waits for the next sweep
+        expire_stock(today=today - timedelta(days=1))
+
+    def get(self, **params):
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        response = client.get('/api/inventory/low_stock/', params, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_expired_batches_are_left_out(self):
+        self.assertEqual([item['id'] for item in self.get()['results']], [self.in_date.pk])
+        self.assertEqual(self.get(summary='1')['total_quantity'], 3)
+        group, = self.get(group_by='variant')['results']
+        self.assertEqual((group['items'], group['total_quantity']), (1, 3))
+
+
+class ExpiringStockTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', 'staff@example.com', 'pw', role='STAFF')
+        product, = create_products(Category.objects.create(name='Pickles', slug='pickles'), 1)
+        cls.variant = ProductVariant.objects.create(product=product, size='Small', price=5, sku='P-S')
+        today = timezone.localdate()
+        cls.items = {}
+        for days, quantity in [(-1, 4), (0, 1), (5, 0), (10, 2), (365, 3), (366, 5)]:
+            batch = Batch.objects.create(production_date=today - timedelta(days=60), expiry_date=today + timedelta(days=days))
+            cls.items[days] = InventoryItem.objects.create(product_variant=cls.variant, batch=batch, quantity=quantity)
+
+    def expiring(self, days):
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        return client.get('/api/inventory/expiring/', {'days': days}, HTTP_ACCEPT='application/json')
+
+    def test_days_bounds(self):
+        for days, expected in [(0, [0]), (10, [0, 10]), (365, [0, 10, 365])]:
+            with self.subTest(days=days):
+                response = self.expiring(days)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    [item['id'] for item in response.json()['results']], [self.items[day].pk for day in expected]
+                )
+
+        for days in ['-1', '366', 'ten', '1.5', '']:
+            with self.subTest(days=days):
+                self.assertEqual(self.expiring(days).status_code, 400)
+
+    def test_sweep_writes_off_expired_batches(self):
+        self.assertEqual(sweep_expired_stock.delay().get(), {'items': 1, 'units': 4})
+        expired = self.items[-1]
+        expired.refresh_from_db()
+        self.assertEqual((expired.quantity, expired.expired_quantity), (0, 4))
+        self.variant.stock.refresh_from_db()
+        self.assertEqual(self.variant.stock.on_hand, 11)
+
+        # Nothing left to write off
+        self.assertEqual(sweep_expired_stock.delay().get(), {'items': 0, 'units': 0})
+
+
+class ImportCatalogTests(TestCase):
+    """Importing the same keys twice updates rows in place."""
+    @classmethod
+    def setUpTestData(cls):
+        Category.objects.create(name='Pickles', slug='pickles')
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def import_catalog(self, name, content):
+        path = f'{self.directory}/{name}'
+        with open(path, 'w', encoding='utf-8') as stream:
+            stream.write(content)
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('import_catalog', path, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_second_import_updates_in_place(self):
+        today = timezone.localdate()
+        stdout, stderr = self.import_catalog('catalog.csv', (
+            'category,slug,name,price,sku,size,batch_number,production_date,expiry_date,quantity\n'
+            f'pickles,mango,Mango Pickle,100,M-S,Small,B1,{today},{today + timedelta(days=90)},20\n'
+            f'pickles,lime,Lime Pickle,80,L-S,Small,B1,{today},{today + timedelta(days=90)},5\n'
+            'chutneys,tomato,Tomato Chutney,60,,,,,,\n'
+        ))
+        self.assertIn('2 products, 2 variants, 1 batches, 2 inventory rows. Skipped 1.', stdout)
+        self.assertIn("Line 4: unknown category 'chutneys'", stderr)
+        version = get_catalog_version()
+
+        rows = [
+            {'category': 'pickles', 'slug': 'mango', 'name': 'Mango Pickle', 'price': '120', 'sku': 'M-S',
+             'size': 'Small', 'variant_price': '125', 'batch_number': 'B1', 'production_date': str(today),
+             'expiry_date': str(today + timedelta(days=90)), 'quantity': 7},
+            {'category': 'pickles', 'name': 'Garlic Pickle', 'price': '90'},
+        ]
+        stdout, _ = self.import_catalog('catalog.jsonl', ''.join(json.dumps(row) + '\n' for row in rows))
+        self.assertIn('2 products, 1 variants, 1 batches, 1 inventory rows. Skipped 0.', stdout)
+
+        self.assertEqual(
+            dict(Product.objects.values_list('slug', 'price')),
+            {'mango': Decimal('120.00'), 'lime': Decimal('80.00'), 'garlic-pickle': Decimal('90.00')},
+        )
+        self.assertEqual(dict(ProductVariant.objects.values_list('sku', 'price')), {
+            'M-S': Decimal('125.00'), 'L-S': Decimal('80.00'),
+        })
+        self.assertEqual(Batch.objects.count(), 1)
+        self.assertEqual(
+            dict(InventoryItem.objects.values_list('product_variant__sku', 'quantity')), {'M-S': 7, 'L-S': 5}
+        )
+        # The work signals would have done
+        self.assertEqual(ProductVariant.objects.get(sku='M-S').stock.on_hand, 7)
+        self.assertEqual(Product.objects.get(slug='mango').min_price, Decimal('125.00'))
+        self.assertNotEqual(get_catalog_version(), version)
+
+
+class OrderTotalsTests(TestCase):
+    def test_totals_come_from_catalog_prices(self):
+        user = User.objects.create_user('customer', 'customer@example.com', 'pw')
+        product, = create_products(Category.objects.create(name='Pickles', slug='pickles'), 1)
+        variant = ProductVariant.objects.create(product=product, size='Large', price='250.00', sku='P-L')
+
+        order = place_order(
+            self, user, [(variant, 4)], subtotal='0.01', shipping_cost='0.00', tax='0.00', total='0.01'
+        )
+        self.assertEqual(
+            (order.subtotal, order.shipping_cost, order.tax, order.total),
+            (Decimal('1000.00'), Decimal('0.00'), Decimal('70.00'), Decimal('1070.00')),
+        )
+        self.assertEqual(list(order.items.values_list('price', flat=True)), [Decimal('250.00')])
+
+
+class AllocationTests(TestCase):
+    """Stock is allocated FIFO by batch expiry, once, with a ledger of what came from where."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer', 'customer@example.com', 'pw')
+        product, = create_products(Category.objects.create(name='Pickles', slug='pickles'), 1)
+        cls.small = ProductVariant.objects.create(product=product, size='Small', price=5, sku='P-S')
+        cls.large = ProductVariant.objects.create(product=product, size='Large', price=9, sku='P-L')
+        today = timezone.localdate()
+        batches = [
+            Batch.objects.create(production_date=today - timedelta(days=90), expiry_date=today + timedelta(days=days))
+            for days in (-1, 10, 40)
+        ]
+        cls.expired, cls.soon, cls.later = [
+            InventoryItem.objects.create(product_variant=cls.small, batch=batch, quantity=quantity)
+            for batch, quantity in zip(batches, (50, 3, 10))
+        ]
+        cls.large_stock = InventoryItem.objects.create(product_variant=cls.large, batch=batches[2], quantity=1)
+
+    def quantities(self):
+        return [
+            InventoryItem.objects.get(pk=item.pk).quantity
+            for item in (self.expired, self.soon, self.later, self.large_stock)
+        ]
+
+    def test_allocates_fifo_and_records_the_ledger(self):
+        with CaptureQueriesContext(connection) as queries:
+            order = place_order(self, self.customer, [(self.small, 5), (self.small, 4)])
+        if connection.features.has_select_for_update:
+            # The order row, then every candidate inventory row in one statement
+            self.assertEqual(len([query for query in queries if 'FOR UPDATE' in query['sql']]), 2)
+        self.assertEqual(self.quantities(), [50, 0, 4, 1])
+        self.assertEqual(
+            list(OrderItemAllocation.objects.filter(order_item__order=order).order_by('pk').values_list(
+                'order_item__quantity', 'inventory_item', 'quantity'
+            )),
+            [(5, self.soon.pk, 3), (5, self.later.pk, 2), (4, self.later.pk, 4)],
+        )
+        self.assertIsNotNone(order.stock_allocated_at)
+        self.assertNotIn('WARNING', order.notes or '')
+
+    def test_shortage_is_flagged(self):
+        order = place_order(self, self.customer, [(self.small, 2), (self.large, 3)])
+        self.assertEqual(self.quantities(), [50, 1, 10, 0])
+        self.assertEqual(order.notes, f'WARNING: Insufficient stock for {self.large}.')
+        self.assertEqual(
+            OrderItemAllocation.objects.filter(order_item__order=order).aggregate(total=Sum('quantity'))['total'], 3
+        )
+
+    def test_rerun_is_a_no_op(self):
+        order = place_order(self, self.customer, [(self.small, 5)])
+        with self.captureOnCommitCallbacks(execute=True), self.assertNumQueries(3):
+            # Savepoint, the locked order read, and its release
+            process_order.delay(order.pk)
+        self.assertEqual(self.quantities(), [50, 0, 8, 1])
+        self.assertEqual(OrderItemAllocation.objects.filter(order_item__order=order).count(), 2)
+
+    def test_cancel_returns_stock_to_its_batches(self):
+        order = place_order(self, self.customer, [(self.small, 5), (self.large, 1)])
+        self.assertEqual(self.quantities(), [50, 0, 8, 0])
+
+        client = APIClient()
+        client.force_authenticate(self.customer)
+        response = client.post(f'/api/orders/{order.pk}/cancel/', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.quantities(), [50, 3, 10, 1])
+        self.assertFalse(OrderItemAllocation.objects.filter(order_item__order=order).exists())
+
+        response = client.post(f'/api/orders/{order.pk}/cancel/', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.quantities(), [50, 3, 10, 1])
+
+    def test_cancelled_orders_are_skipped(self):
+        order = place_order(self, self.customer, [(self.small, 1)])
+        Order.objects.filter(pk=order.pk).update(status='CANCELLED', stock_allocated_at=None)
+        process_order.delay(order.pk)
+        self.assertEqual(self.quantities(), [50, 2, 10, 1])
+
+
+class ConfirmPaymentTests(TestCase):
+    """A payment intent confirms one order, once."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer', 'customer@example.com', 'pw')
+        cls.order, cls.other = create_orders(cls.customer, 2)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def confirm(self, order, intent='pi_1'):
+        return self.client.post(
+            '/api/payments/confirm-payment/',
+            {'order_id': order.pk, 'payment_intent_id': intent, 'payment_method': 'CREDIT_CARD'},
+            format='json',
+        )
+
+    def test_repeated_confirm_returns_the_same_payment(self):
+        first = self.confirm(self.order)
+        self.assertEqual(first.status_code, 200)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'PROCESSING')
+
+        second = self.confirm(self.order)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json()['payment']['id'], first.json()['payment']['id'])
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_intent_used_for_another_order_conflicts(self):
+        self.assertEqual(self.confirm(self.order).status_code, 200)
+
+        response = self.confirm(self.other)
+        self.assertEqual(response.status_code, 409)
+        self.other.refresh_from_db()
+        self.assertEqual(self.other.status, 'DELIVERED')
+        self.assertEqual(list(Payment.objects.values_list('order_id', flat=True)), [self.order.pk])
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', 'staff@example.com', 'pw', role='STAFF')
+        cls.customer = User.objects.create_user('customer', 'customer@example.com', 'pw')
+        product, = create_products(Category.objects.create(name='Pickles', slug='pickles'), 1)
+        variant = ProductVariant.objects.create(product=product, size='Large', price='250.00', sku='P-L')
+        order, = create_orders(cls.customer, 1)
+        order.items.create(product_variant=variant, quantity=4, price=250)
+        Payment.objects.create(
+            order=order, amount=1000, payment_method='CREDIT_CARD', transaction_id='pi_1', status='COMPLETED'
+        )
+
+    def export(self, path, user=None):
+        client = APIClient()
+        client.force_authenticate(user or self.staff)
+        return client.get(path)
+
+    def rows(self, name):
+        response = self.export(f'/api/exports/{name}.csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        csv_rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+
+        response = self.export(f'/api/exports/{name}.jsonl')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        jsonl_rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        return csv_rows, jsonl_rows
+
+    def assertSameRows(self, csv_rows, jsonl_rows):
+        # CSV has no types: None is written as '' and numbers as text
+        self.assertEqual(csv_rows, [
+            {key: '' if value is None else str(value) for key, value in row.items()} for row in jsonl_rows
+        ])
+
+    def test_formats_write_the_same_values(self):
+        for name in ['orders', 'order-items', 'payments']:
+            with self.subTest(name):
+                self.assertSameRows(*self.rows(name))
+
+    def test_values(self):
+        _, (order,) = self.rows('orders')
+        self.assertEqual((order['order_number'], order['total']), (f'ORD-{self.customer.pk}-0', '0.00'))
+        self.assertTrue(order['created_at'].endswith('Z'))
+        self.assertIsNone(order['stock_allocated_at'])
+
+        _, (item,) = self.rows('order-items')
+        self.assertEqual((item['sku'], item['quantity'], item['price'], item['line_total']), ('P-L', 4, '250.00', '1000.00'))
+
+        _, (payment,) = self.rows('payments')
+        self.assertEqual((payment['transaction_id'], payment['amount']), ('pi_1', '1000.00'))
+
+    def test_unknown_format(self):
+        self.assertEqual(self.export('/api/exports/orders.xml').status_code, 404)
+
+    def test_customers_are_forbidden(self):
+        self.assertEqual(self.export('/api/exports/orders.csv', user=self.customer).status_code, 403)
+
+
+class OrderPipelineTests(TestCase):
+    """Order creation queues allocation and notifications, run eagerly in tests."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer', 'customer@example.com', 'pw')
+        User.objects.create_user('staff', 'staff@example.com', 'pw', role='STAFF')
+        product, = create_products(Category.objects.create(name='Pickles', slug='pickles'), 1)
+        cls.variant = ProductVariant.objects.create(product=product, size='Small', price=5, sku='P-S')
+        today = timezone.localdate()
+        batch = Batch.objects.create(production_date=today, expiry_date=today + timedelta(days=30))
+        cls.inventory = InventoryItem.objects.create(product_variant=cls.variant, batch=batch, quantity=3)
+
+    def place_order(self, quantity):
+        return place_order(self, self.customer, [(self.variant, quantity)])
+
+    def test_stockout_is_allocated_flagged_and_notified_once(self):
+        order = self.place_order(5)
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.quantity, 0)
+        self.assertIn('WARNING: Insufficient stock', order.notes)
+        self.assertIsNotNone(order.stock_allocated_at)
+        self.assertIsNotNone(order.notified_at)
+        self.assertEqual(
+            [(message.subject, message.to) for message in mail.outbox],
+            [(f'Order {order.order_number} received', ['customer@example.com']),
+             (f'Stockout on order {order.order_number}', ['staff@example.com'])],
+        )
+
+        # Redelivered tasks change nothing
+        with self.captureOnCommitCallbacks(execute=True):
+            process_order.delay(order.pk)
+            send_order_notifications.delay(order.pk, stockout=True)
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.quantity, 0)
+        self.assertEqual(Order.objects.get(pk=order.pk).notes, order.notes)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_failed_send_releases_claim(self):
+        order = self.place_order(1)
+        Order.objects.filter(pk=order.pk).update(notified_at=None)
+        with mock.patch('pickle_app.tasks.send_mass_mail', side_effect=SMTPException()):
+            with self.assertRaises(Retry):
+                send_order_notifications.delay(order.pk)
+        order.refresh_from_db()
+        self.assertIsNone(order.notified_at)
+
+        send_order_notifications.delay(order.pk)
+        order.refresh_from_db()
+        self.assertIsNotNone(order.notified_at)
+        self.assertEqual(len(mail.outbox), 2)
+
+
+class TokenAuthTests(TestCase):
+    """Requests are authorized from the token claims; refresh and logout go through the blacklist."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('staff', 'staff@example.com', 'pw', role='STAFF')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def login(self):
+        response = self.client.post('/api/auth/login/', {'email': 'staff@example.com', 'password': 'pw'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def refresh(self, token):
+        return self.client.post('/api/auth/login/refresh/', {'refresh': token}, format='json')
+
+    def test_authenticated_list_does_not_load_the_user(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.login()['access']}")
+        with self.assertNumQueries(1) as queries:
+            response = self.client.get('/api/orders/')
+        self.assertEqual(response.status_code, 200)
+        user_table = User._meta.db_table
+        self.assertEqual([query['sql'] for query in queries if user_table in query['sql']], [])
+
+    def test_role_claim(self):
+        tokens = self.login()
+        self.assertEqual(AccessToken(tokens['access'])['role'], 'STAFF')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.assertEqual(self.client.get('/api/inventory/').status_code, 200)
+
+        # A refresh picks up role changes
+        User.objects.filter(pk=self.user.pk).update(role='CUSTOMER')
+        response = self.refresh(tokens['refresh'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AccessToken(response.json()['access'])['role'], 'CUSTOMER')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.json()['access']}")
+        self.assertEqual(self.client.get('/api/inventory/').status_code, 403)
+
+    def test_refresh_of_inactive_user_is_rejected(self):
+        tokens = self.login()
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.refresh(tokens['refresh']).status_code, 401)
+
+    def test_logout_blacklists_the_refresh_token(self):
+        tokens = self.login()
+        self.assertEqual(self.refresh(tokens['refresh']).status_code, 200)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/auth/logout/', {'refresh_token': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, 205)
+        self.assertEqual(self.refresh(tokens['refresh']).status_code, 401)
+
+        self.assertEqual(self.client.post('/api/auth/logout/', {'refresh_token': 'junk'}, format='json').status_code, 400)
+
+
+class RevocationFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('customer', 'customer@example.com', 'pw')
+
+    def setUp(self):
+        cache.clear()
+
+    def blacklist(self, jti):
+        # As another process would: the row only, nothing added to this filter
+        token = OutstandingToken.objects.create(
+            user=self.user, jti=jti, token=jti, expires_at=timezone.now() + timedelta(days=1)
+        )
+        return BlacklistedToken.objects.create(token=token)
+
+    def test_syncs_on_an_interval(self):
+        revocations = LocalRevocationFilter(sync_interval=3600)
+        self.assertFalse(revocations.might_contain('first'))
+        self.blacklist('first')
+        with self.assertNumQueries(0):
+            self.assertFalse(revocations.might_contain('first'))
+
+        with mock.patch('pickle_app.revocation.time.monotonic', return_value=time.monotonic() + 3600):
+            self.assertTrue(revocations.might_contain('first'))
+
+    def test_pruned_rows_are_dropped(self):
+        revocations = LocalRevocationFilter(sync_interval=0)
+        self.blacklist('first')
+        pruned = self.blacklist('pruned')
+        self.assertTrue(revocations.might_contain('pruned'))
+
+        pruned.delete()
+        self.assertFalse(revocations.might_contain('pruned'))
+        self.assertTrue(revocations.might_contain('first'))
+
+    def test_missing_redis_bitmap_is_rebuilt_in_background(self):
+        with mock.patch('pickle_app.revocation.Redis') as redis, \
+                mock.patch('pickle_app.revocation.threading.Thread') as thread, \
+                mock.patch.object(RedisRevocationFilter, 'rebuild') as rebuild:
+            revocations = RedisRevocationFilter('redis://')
+            redis.from_url.return_value.pipeline.return_value.execute.return_value = [0] * (revocations.hashes + 1)
+            # Fail open: callers check the blacklist table while the bitmap is missing
+            self.assertTrue(revocations.might_contain('first'))
+            self.assertTrue(revocations.might_contain('second'))
+
+        thread.assert_called_once_with(target=revocations._rebuild_and_unlock, daemon=True)
+        rebuild.assert_not_called()
+
+    def test_add_after_flush_leaves_the_bitmap_to_the_rebuild(self):
+        with mock.patch('pickle_app.revocation.Redis') as redis, \
+                mock.patch('pickle_app.revocation.threading.Thread') as thread:
+            client = redis.from_url.return_value
+            revocations = RedisRevocationFilter('redis://')
+            add_if_exists = client.register_script.return_value
+            add_if_exists.return_value = 0  # The key was flushed
+            revocations.add('revoked')
+
+        add_if_exists.assert_called_once_with(keys=[revocations.key], args=revocations.positions('revoked'))
+        # No bits written outside the script, so no partial bitmap is created
+        client.setbit.assert_not_called()
+        client.pipeline.assert_not_called()
+        thread.assert_called_once_with(target=revocations._rebuild_and_unlock, daemon=True)
+
+    def test_add_to_an_existing_bitmap(self):
+        with mock.patch('pickle_app.revocation.Redis') as redis, \
+                mock.patch('pickle_app.revocation.threading.Thread') as thread:
+            revocations = RedisRevocationFilter('redis://')
+            redis.from_url.return_value.register_script.return_value.return_value = 1
+            revocations.add('revoked')
+        thread.assert_not_called()
+
+    def test_filters_must_implement_every_operation(self):
+        class Partial(RevocationFilter):
+            def add(self, jti):
+                pass
+
+        with self.assertRaises(TypeError):
+            Partial()
+
+
+class SalesAnalyticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', 'staff@example.com', 'pw', role='STAFF')
+        customer = User.objects.create_user('customer', 'customer@example.com', 'pw')
+        for order, total, order_status in zip(
+            create_orders(customer, 3), ['10.00', '20.00', '5.50'], ['DELIVERED', 'DELIVERED', 'CANCELLED']
+        ):
+            Order.objects.filter(pk=order.pk).update(total=Decimal(total), status=order_status)
+        refresh_sales_rollups()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def sales(self, **params):
+        return self.client.get('/api/analytics/sales/', params)
+
+    def test_totals_are_decimal_strings(self):
+        response = self.sales()
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['totals'], {
+            'order_count': 3, 'units': 0, 'revenue': '35.50', 'average_order_value': '11.83',
+        })
+        today = str(timezone.localdate())
+        self.assertEqual(data['results'], [{
+            'date': today, 'units': 0, 'revenue': '35.50', 'order_count': 3, 'average_order_value': '11.83',
+        }])
+
+        data = self.sales(group_by='status', status='DELIVERED').json()
+        self.assertEqual(data['totals']['revenue'], '30.00')
+        self.assertEqual(data['results'], [{
+            'status': 'DELIVERED', 'units': 0, 'revenue': '30.00', 'order_count': 2, 'average_order_value': '15.00',
+        }])
+
+    def test_empty_range(self):
+        data = self.sales(date_from='2020-01-01', date_to='2020-01-31').json()
+        self.assertEqual(data['totals'], {
+            'order_count': 0, 'units': 0, 'revenue': '0.00', 'average_order_value': None,
+        })
+        self.assertEqual(data['results'], [])
+
+    def test_invalid_parameters(self):
+        today = timezone.localdate()
+        for params in [
+            {'group_by': 'week'},
+            {'date_from': 'yesterday'},
+            {'date_from': str(today), 'date_to': str(today - timedelta(days=1))},
+            {'date_from': str(today - timedelta(days=366)), 'date_to': str(today)},
+            {'status': 'LOST'},
+        ]:
+            with self.subTest(params):
+                self.assertEqual(self.sales(**params).status_code, 400)
+
+    def test_customers_are_forbidden(self):
+        self.client.force_authenticate(User.objects.get(username='customer'))
+        self.assertEqual(self.sales().status_code, 403)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Needs row locks')
+class SalesRollupTests(TransactionTestCase):
+    def test_explicit_days_run_during_another_refresh(self):
+        user = User.objects.create_user('customer', 'customer@example.com', 'pw')
+        create_orders(user, 3)
+        RollupCheckpoint.objects.create(name=SALES_CHECKPOINT)
+
+        locked, release = threading.Event(), threading.Event()
+
+        def hold_checkpoint():
+            try:
+                with transaction.atomic():
+                    RollupCheckpoint.objects.select_for_update().get(name=SALES_CHECKPOINT)
+                    locked.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        holder = threading.Thread(target=hold_checkpoint)
+        holder.start()
+        try:
+            locked.wait(10)
+            self.assertEqual(refresh_sales_rollups(), 0)
+            self.assertEqual(refresh_sales_rollups([timezone.localdate()]), 1)
+        finally:
+            release.set()
+            holder.join()
+        self.assertEqual(DailySales.objects.get(status='DELIVERED').order_count, 2)
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', 'staff@example.com', 'pw', role='STAFF')
+        create_orders(cls.staff, 25)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def get(self, url):
+        response = self.client.get(url, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def walk(self, url, direction):
+        pages = []
+        while url:
+            page = self.get(url)
+            pages.append([order['id'] for order in page['results']])
+            url = page[direction]
+        return pages
+
+    def test_pages_follow_ordering_through_ties(self):
+        # Totals repeat every 7 orders; ties are broken by id
+        for ordering, tiebreak in [('-created_at', '-id'), ('total', 'id'), ('-total', '-id')]:
+            with self.subTest(ordering=ordering):
+                expected = list(Order.objects.order_by(ordering, tiebreak).values_list('id', flat=True))
+                pages = self.walk(f'/api/orders/?ordering={ordering}', 'next')
+                self.assertEqual([pk for page in pages for pk in page], expected)
+
+                # And back again from the last page
+                last = self.get(f'/api/orders/?ordering={ordering}')
+                while last['next']:
+                    last = self.get(last['next'])
+                previous = self.walk(last['previous'], 'previous')
+                self.assertEqual([pk for page in reversed(previous) for pk in page], expected[:-len(last['results'])])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/orders/?cursor=bogus', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 404)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Query plans are checked on PostgreSQL only')
+class QueryPlanTests(TestCase):
+    """
+    The filters our busiest viewsets run use the indexes added for them,
+    under the planner's default settings, on tables big enough that a
+    sequential scan isn't the cheapest plan.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        today = timezone.localdate()
+        cls.categories = [Category.objects.create(name=f'Category {i}', slug=f'category-{i}') for i in range(20)]
+        products = []
+        for i, category in enumerate(cls.categories):
+            products += create_products(category, 250, prefix=f'Item{i}')
+        create_products(cls.categories[0], 1, prefix='Mango')
+        Product.objects.filter(pk__in=[product.pk for product in products[::100]]).update(featured=True)
+
+        cls.users = [
+            User.objects.create_user(f'customer{i}', f'customer{i}@example.com', 'pw') for i in range(20)
+        ]
+        orders = []
+        for user in cls.users:
+            orders += create_orders(user, 250)
+        Payment.objects.bulk_create(
+            Payment(order=order, amount=order.total, payment_method='CREDIT_CARD', status='COMPLETED')
+            for order in orders
+        )
+
+        cls.variants = ProductVariant.objects.bulk_create(
+            ProductVariant(product=product, size='Small', price=product.price, sku=f'SKU-{product.pk}')
+            for product in products[:500]
+        )
+        batches = Batch.objects.bulk_create(
+            Batch(
+                batch_number=f'B-{i}', production_date=today - timedelta(days=100),
+                expiry_date=today + timedelta(days=i - 5),
+            )
+            for i in range(2000)
+        )
+        InventoryItem.objects.bulk_create(
+            InventoryItem(product_variant=variant, batch=batch, quantity=i % 40)
+            for i, (variant, batch) in enumerate((variant, batch) for variant in cls.variants for batch in batches[:50:5])
+        )
+        analyze()
+
+    def assertUsesIndex(self, queryset, *indexes):
+        """
+        Assert that the plan scans one of ``indexes``.
+        """
+        plan = queryset.explain()
+        self.assertTrue(any(f' {index} ' in f'{plan} '.replace('\n', ' ') for index in indexes), plan)
+        self.assertNotIn(f'Seq Scan on {queryset.model._meta.db_table}', plan)
+
+    def test_orders_by_user_and_status(self):
+        queryset = Order.objects.filter(user=self.users[3], status='PENDING').order_by('-created_at', '-id')[:11]
+        self.assertUsesIndex(queryset, 'order_user_status_created_idx')
+
+    def test_orders_by_status(self):
+        queryset = Order.objects.filter(status='PENDING').order_by('-created_at', '-id')[:11]
+        self.assertUsesIndex(queryset, 'order_status_created_id_idx')
+
+    def test_keyset_page(self):
+        ordering = ('-total', '-id')
+        after = KeysetPagination()._after(Order.objects.all(), ordering, '["3.00", 2500]')
+        queryset = Order.objects.filter(after).order_by(*ordering)[:11]
+        self.assertUsesIndex(queryset, 'order_total_id_idx')
+        self.assertIn('Index Cond: (ROW(total, id) < ROW(', queryset.explain())
+
+    def test_payments_by_order_and_status(self):
+        queryset = Payment.objects.filter(order=Order.objects.first(), status='COMPLETED')
+        self.assertUsesIndex(queryset, 'payment_order_status_idx')
+
+    def test_allocation_candidates(self):
+        # As allocate_order_items filters: the (product_variant, batch) unique
+        # index or the product_variant foreign key index both fit
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, InventoryItem._meta.db_table)
+        indexes = [
+            name for name, constraint in constraints.items()
+            if constraint['index'] and constraint['columns'][0] == 'product_variant_id'
+        ]
+        queryset = InventoryItem.objects.filter(
+            product_variant_id__in=[self.variants[0].pk, self.variants[1].pk],
+            quantity__gt=0,
+            batch__expiry_date__gte=timezone.localdate(),
+        ).order_by('product_variant_id', 'batch__expiry_date', 'id')
+        self.assertUsesIndex(queryset, *indexes)
+
+    def test_search_by_category_and_price(self):
+        queryset = Product.objects.filter(
+            available=True, category=self.categories[5], price__gte=110, price__lte=120
+        ).order_by('price')[:10]
+        self.assertUsesIndex(queryset, 'product_avail_cat_price_idx')
+
+    def test_featured_in_category(self):
+        queryset = Product.objects.filter(available=True, featured=True, category=self.categories[5])[:10]
+        self.assertUsesIndex(queryset, 'product_avail_feat_cat_idx')
+
+    def test_newest_products(self):
+        queryset = Product.objects.filter(available=True).order_by('-created_at')[:10]
+        self.assertUsesIndex(queryset, 'product_avail_created_idx')
+
+    def test_expired_batches(self):
+        queryset = Batch.objects.filter(expiry_date__lt=timezone.localdate())
+        self.assertUsesIndex(queryset, 'batch_expiry_id_idx')
+
+    def test_full_text_search(self):
+        request = Request(APIRequestFactory().get('/api/search/', {'search': 'mango'}))
+        queryset = ProductSearchFilter().filter_queryset(request, Product.objects.all(), SearchView())
+        self.assertUsesIndex(queryset, 'product_search_vector_gin')
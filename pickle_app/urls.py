@@ -11,7 +11,11 @@ from .views import (
     BatchViewSet, InventoryViewSet,
     OrderViewSet, PaymentViewSet,
     CreatePaymentIntentView, ConfirmPaymentView,
-    SearchView
+    SearchView, SalesAnalyticsView
+)
+from .exports import OrderExportView, OrderItemExportView, PaymentExportView
+from .async_views import (
+    home_view, category_list, category_detail, product_list, product_detail, search_view
 )
 
 router = DefaultRouter()
@@ -24,7 +28,7 @@ router.register(r'payments', PaymentViewSet, basename='payment')
 
 urlpatterns = [
     # Authentication endpoints
-    path('', HomeView.as_view(), name='home'),
+    path('', home_view, name='home'),
     path('auth/register/', RegisterView.as_view(), name='register'),
     path('auth/login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('auth/login/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
@@ -36,8 +40,23 @@ urlpatterns = [
     path('payments/create-payment-intent/', CreatePaymentIntentView.as_view(), name='create_payment_intent'),
     path('payments/confirm-payment/', ConfirmPaymentView.as_view(), name='confirm_payment'),
     
+    # Staff reporting
+    path('analytics/sales/', SalesAnalyticsView.as_view(), name='sales_analytics'),
+    
+    # Staff exports, streamed as .csv or .jsonl
+    path('exports/orders.<slug:extension>', OrderExportView.as_view(), name='export-orders'),
+    path('exports/order-items.<slug:extension>', OrderItemExportView.as_view(), name='export-order-items'),
+    path('exports/payments.<slug:extension>', PaymentExportView.as_view(), name='export-payments'),
+    
     # Search endpoint
-    path('search/', SearchView.as_view(), name='search'),
+    path('search/', search_view, name='search'),
+    
+    # Async read path for the storefront catalog; writes fall through to the viewsets.
+    # The router's routes for these URLs keep their names and format suffixes.
+    path('products/categories/', category_list, name='async-category-list'),
+    path('products/categories/<slug:slug>/', category_detail, name='async-category-detail'),
+    path('products/', product_list, name='async-product-list'),
+    path('products/<slug:slug>/', product_detail, name='async-product-detail'),
     
     # Router endpoints
     path('', include(router.urls)),
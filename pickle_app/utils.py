@@ -1,6 +1,9 @@
+import datetime
 import uuid
+from decimal import ROUND_HALF_UP, Decimal
 import random
 import string
+from django.utils import timezone
 from django.utils.text import slugify
 
 from pickle_app import models
@@ -41,7 +44,7 @@ def generate_batch_number():
     batch_number = f"B-{uuid.uuid4().hex[:8].upper()}"
     return batch_number
 
-def calculate_order_totals(items, shipping_cost=0, tax_rate=0.07):
+def calculate_order_totals(items, shipping_cost=0, tax_rate='0.07'):
     """
     Calculate order subtotal, tax, and total.
     
@@ -51,11 +54,11 @@ def calculate_order_totals(items, shipping_cost=0, tax_rate=0.07):
         tax_rate: Tax rate as a decimal (default 7%)
     
     Returns:
-        Dict with 'subtotal', 'tax', and 'total' keys
+        Dict with 'subtotal', 'tax', and 'total' keys, as Decimals rounded to the cent
     """
-    subtotal = sum(item['quantity'] * item['price'] for item in items)
-    tax = subtotal * tax_rate
-    total = subtotal + tax + shipping_cost
+    subtotal = sum((item['quantity'] * Decimal(item['price']) for item in items), Decimal('0.00'))
+    tax = (subtotal * Decimal(str(tax_rate))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    total = subtotal + tax + Decimal(str(shipping_cost))
     
     return {
         'subtotal': subtotal,
@@ -63,9 +66,15 @@ def calculate_order_totals(items, shipping_cost=0, tax_rate=0.07):
         'total': total
     }
 
+def start_of_day(value):
+    """
+    Aware datetime for midnight at the start of ``value`` in the current time zone.
+    """
+    return timezone.make_aware(datetime.datetime.combine(value, datetime.time.min))
+
 def check_low_stock_items():
     """
     Check for low stock items and return a list of them.
     """
-    from .models import InventoryItem
-    return InventoryItem.objects.filter(quantity__lte=models.F('low_stock_threshold'))
\ No newline at end of file
+    from .stock import low_stock_items
+    return low_stock_items()
\ No newline at end of file
@@ -1,40 +1,57 @@
 # pickle_app/views.py
+import datetime
+
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 from django.contrib.auth import get_user_model
-from django.db.models import Q, F
+from django.db import IntegrityError, transaction
+from django.utils import timezone
 from rest_framework import viewsets, generics, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.permissions import IsAuthenticated, AllowAny, SAFE_METHODS
 from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.parsers import MultiPartParser, FormParser
 from django_filters.rest_framework import DjangoFilterBackend
 
 from .models import (
     Category, Product, ProductImage, ProductVariant,
-    Batch, InventoryItem, Order, OrderItem, Payment
+    Batch, InventoryItem, Order, OrderItem, Payment, DailySales
 )
 from .serializers import (
     UserSerializer, RegisterSerializer, PasswordChangeSerializer,
-    CategorySerializer, ProductSerializer, ProductImageSerializer, ProductVariantSerializer,
+    CategorySerializer, ProductSerializer, ProductListSerializer,
+    ProductImageSerializer, ProductVariantSerializer,
     BatchSerializer, InventoryItemSerializer,
     OrderSerializer, OrderCreateSerializer, OrderItemSerializer,
-    PaymentSerializer, PaymentIntentSerializer, PaymentConfirmSerializer
+    PaymentSerializer, PaymentIntentSerializer, PaymentConfirmSerializer,
+    SalesRowSerializer, SalesTotalsSerializer
 )
 from .permissions import IsAdminUser, IsStaffUser, IsOwnerOrAdmin
+from .cache import CatalogCacheMixin, ConditionalGetMixin
+from .fastpath import ValuesListMixin
+from .fieldsets import SparseFieldsetMixin
+from .pagination import KeysetPagination
+from .search import ProductSearchFilter
+from .stock import LOW_STOCK_GROUPS, expiring_items, low_stock_groups, low_stock_items, low_stock_summary
+from .allocation import release_order_stock
+from .analytics import SALES_GROUPS, sales_report, sales_totals, with_average_order_value
+from .authentication import get_full_user
+from .revocation import RevocableRefreshToken
+from .tasks import process_order
 
 User = get_user_model()
 class HomeView(generics.GenericAPIView):
     permission_classes = (AllowAny,)
+    welcome = {
+        "message": "Welcome to Pickle Paradise!",
+        "tagline": "Savor the taste of tradition with every bite.",
+        "info": "Browse our products, place an order, or sign up to join our foodie community!"
+    }
     
     def get(self, request):
-        return Response({
-            "message": "Welcome to Pickle Paradise!",
-            "tagline": "Savor the taste of tradition with every bite.",
-            "info": "Browse our products, place an order, or sign up to join our foodie community!"
-        }, status=status.HTTP_200_OK)
+        return Response(self.welcome, status=status.HTTP_200_OK)
 # Authentication Views
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
@@ -48,7 +65,7 @@ class LogoutView(generics.GenericAPIView):
     def post(self, request):
         try:
             refresh_token = request.data.get("refresh_token")
-            token = RefreshToken(refresh_token)
+            token = RevocableRefreshToken(refresh_token)
             token.blacklist()
             return Response(status=status.HTTP_205_RESET_CONTENT)
         except Exception:
@@ -59,7 +76,8 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
     permission_classes = (IsAuthenticated,)
 
     def get_object(self):
-        return self.request.user
+        # Reads can use the cached row; updates start from the current one
+        return get_full_user(self.request, fresh=self.request.method not in SAFE_METHODS)
 
 class PasswordChangeView(generics.GenericAPIView):
     permission_classes = (IsAuthenticated,)
@@ -68,7 +86,7 @@ class PasswordChangeView(generics.GenericAPIView):
     def post(self, request):
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
-            user = request.user
+            user = get_full_user(request, fresh=True)
             if not user.check_password(serializer.validated_data['current_password']):
                 return Response({"current_password": ["Wrong password."]}, status=status.HTTP_400_BAD_REQUEST)
             user.set_password(serializer.validated_data['new_password'])
@@ -77,7 +95,7 @@ class PasswordChangeView(generics.GenericAPIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 # Category Views
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(ConditionalGetMixin, CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     lookup_field = 'slug'
@@ -93,14 +111,25 @@ class CategoryViewSet(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
 # Product Views
-class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all()
+class ProductViewSet(SparseFieldsetMixin, ConditionalGetMixin, CatalogCacheMixin, ValuesListMixin, viewsets.ModelViewSet):
+    queryset = Product.objects.with_related()
     serializer_class = ProductSerializer
     lookup_field = 'slug'
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['category', 'available', 'featured']
     search_fields = ['name', 'description', 'ingredients']
     ordering_fields = ['name', 'price', 'created_at']
+    last_modified_fields = ('updated_at', 'category__updated_at')  # category_name is rendered too
+
+    def get_queryset(self):
+        if self.action == 'list':
+            return Product.objects.for_listing()
+        return super().get_queryset()
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return ProductListSerializer
+        return ProductSerializer
 
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy', 'add_image', 'add_variant']:
@@ -135,25 +164,62 @@ class BatchViewSet(viewsets.ModelViewSet):
     filter_backends = [filters.OrderingFilter]
     ordering_fields = ['production_date', 'expiry_date', 'created_at']
 
-class InventoryViewSet(viewsets.ModelViewSet):
-    queryset = InventoryItem.objects.all()
+class InventoryViewSet(SparseFieldsetMixin, ValuesListMixin, viewsets.ModelViewSet):
+    queryset = InventoryItem.objects.select_related('product_variant__product', 'batch')
     serializer_class = InventoryItemSerializer
+    pagination_class = KeysetPagination
     permission_classes = [IsStaffUser]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['product_variant', 'batch']
     ordering_fields = ['quantity', 'created_at', 'updated_at']
+    max_expiring_days = 365
 
     @action(detail=False, methods=['get'])
     def low_stock(self, request):
-        low_stock_items = InventoryItem.objects.filter(
-            quantity__lte=F('low_stock_threshold')
-        )
-        serializer = self.get_serializer(low_stock_items, many=True)
-        return Response(serializer.data)
+        if request.query_params.get('summary') in ['1', 'true']:
+            return Response(low_stock_summary())
+        
+        group_by = request.query_params.get('group_by')
+        if group_by:
+            if group_by not in LOW_STOCK_GROUPS:
+                return Response(
+                    {"detail": f"Invalid group_by. Must be one of {list(LOW_STOCK_GROUPS)}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            # One row per variant or product, so a numbered page is cheap here
+            paginator = PageNumberPagination()
+            page = paginator.paginate_queryset(low_stock_groups(group_by), request, view=self)
+            return paginator.get_paginated_response(page)
+        
+        queryset = self.filter_queryset(low_stock_items())
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def expiring(self, request):
+        try:
+            days = int(request.query_params.get('days', 30))
+        except ValueError:
+            days = -1
+        if not 0 <= days <= self.max_expiring_days:
+            return Response(
+                {"detail": f"days must be a whole number from 0 to {self.max_expiring_days}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Soonest expiry first; the cursor follows the annotated expiry_date
+        paginator = KeysetPagination()
+        paginator.ordering = ('expiry_date',)
+        queryset = self.filter_queryset(expiring_items(days))
+        page = paginator.paginate_queryset(queryset, request)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
 # Order Views
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     serializer_class = OrderSerializer
+    pagination_class = KeysetPagination
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['status']
     ordering_fields = ['created_at', 'total']
@@ -161,7 +227,7 @@ class OrderViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         if self.request.user.role in ['ADMIN', 'STAFF']:
             return Order.objects.all()
-        return Order.objects.filter(user=self.request.user)
+        return Order.objects.filter(user_id=self.request.user.id)
 
     def get_permissions(self):
         if self.action in ['update', 'partial_update', 'destroy', 'update_status']:
@@ -180,33 +246,12 @@ class OrderViewSet(viewsets.ModelViewSet):
     def create(self, request, *args, **kwargs):
         serializer = OrderCreateSerializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
-        order = serializer.save()
-        
-        # Update inventory after order creation
-        for item in order.items.all():
-            # Find inventory items for this product variant
-            inventory_items = InventoryItem.objects.filter(product_variant=item.product_variant)
+        with transaction.atomic():
+            order = serializer.save()
             
-            quantity_to_fulfill = item.quantity
-            for inv_item in inventory_items.order_by('batch__expiry_date'):  # FIFO inventory management
-                if quantity_to_fulfill <= 0:
-                    break
-                
-                if inv_item.quantity >= quantity_to_fulfill:
-                    inv_item.quantity -= quantity_to_fulfill
-                    inv_item.save()
-                    quantity_to_fulfill = 0
-                else:
-                    quantity_to_fulfill -= inv_item.quantity
-                    inv_item.quantity = 0
-                    inv_item.save()
-            
-            # Check if we couldn't fulfill the order
-            if quantity_to_fulfill > 0:
-                # Handle stockout situation
-                # You might want to flag this order for review
-                order.notes = f"{order.notes}\nWARNING: Insufficient stock for {item.product_variant}."
-                order.save()
+            # Stock allocation, stockout flagging and notifications run in the
+            # background once the order is durably recorded
+            transaction.on_commit(lambda: process_order.delay(order.pk))
         
         return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
 
@@ -222,27 +267,26 @@ class OrderViewSet(viewsets.ModelViewSet):
             )
         
         # Check if user has permission (either admin/staff or the order owner)
-        if not (request.user.role in ['ADMIN', 'STAFF'] or order.user == request.user):
+        if not (request.user.role in ['ADMIN', 'STAFF'] or order.user_id == request.user.id):
             return Response(
                 {"detail": "You don't have permission to cancel this order."},
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        order.status = 'CANCELLED'
-        order.save()
-        
-        # Return inventory items to stock
-        for item in order.items.all():
-            # Create or update inventory item
-            inventory, created = InventoryItem.objects.get_or_create(
-                product_variant=item.product_variant,
-                batch=Batch.objects.latest('created_at'),  # This is simplified; you might want to track which batch was used
-                defaults={'quantity': item.quantity}
-            )
+        with transaction.atomic():
+            # Lock the order so concurrent cancels can't both restore stock
+            order = Order.objects.select_for_update().get(pk=order.pk)
+            if order.status not in ['PENDING', 'PROCESSING']:
+                return Response(
+                    {"detail": "Only pending or processing orders can be cancelled."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            order.status = 'CANCELLED'
+            order.save(update_fields=['status', 'updated_at'])
             
-            if not created:
-                inventory.quantity += item.quantity
-                inventory.save()
+            # Return inventory to the batches it was allocated from
+            release_order_stock(order)
         
         return Response(OrderSerializer(order).data)
 
@@ -270,10 +314,61 @@ class OrderViewSet(viewsets.ModelViewSet):
         
         return Response(OrderSerializer(order).data)
 
+# Analytics Views
+class SalesAnalyticsView(generics.GenericAPIView):
+    """
+    Sales totals from the daily rollup tables, grouped by day, status,
+    category, product or variant. Defaults to the last 30 days.
+    """
+    permission_classes = [IsStaffUser]
+    max_days = 366
+    
+    def get(self, request):
+        group_by = request.query_params.get('group_by', 'day')
+        if group_by not in SALES_GROUPS:
+            return Response(
+                {"detail": f"Invalid group_by. Must be one of {list(SALES_GROUPS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            date_to = request.query_params.get('date_to')
+            date_to = datetime.date.fromisoformat(date_to) if date_to else timezone.localdate()
+            date_from = request.query_params.get('date_from')
+            date_from = datetime.date.fromisoformat(date_from) if date_from else date_to - datetime.timedelta(days=29)
+        except ValueError:
+            return Response(
+                {"detail": "date_from and date_to must be dates in YYYY-MM-DD format."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not 0 <= (date_to - date_from).days < self.max_days:
+            return Response(
+                {"detail": f"date_from must be on or before date_to and at most {self.max_days} days apart."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        statuses = request.query_params.getlist('status')
+        invalid = sorted(set(statuses) - {choice for choice, _ in Order.STATUS_CHOICES})
+        if invalid:
+            return Response({"detail": f"Invalid status: {invalid}"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        results = list(sales_report(group_by, date_from, date_to, statuses))
+        if SALES_GROUPS[group_by][0] is DailySales:
+            with_average_order_value(results)
+        
+        return Response({
+            'group_by': group_by,
+            'date_from': date_from,
+            'date_to': date_to,
+            'totals': SalesTotalsSerializer(sales_totals(date_from, date_to, statuses)).data,
+            'results': SalesRowSerializer(results, many=True).data,
+        })
+
 # Payment Views
 class PaymentViewSet(viewsets.ModelViewSet):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
+    pagination_class = KeysetPagination
     permission_classes = [IsStaffUser]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['order', 'status', 'payment_method']
@@ -292,7 +387,7 @@ class CreatePaymentIntentView(generics.GenericAPIView):
         
         # Get the order and verify the user has access
         order = get_object_or_404(Order, id=order_id)
-        if not (request.user.role in ['ADMIN', 'STAFF'] or order.user == request.user):
+        if not (request.user.role in ['ADMIN', 'STAFF'] or order.user_id == request.user.id):
             return Response(
                 {"detail": "You don't have permission to create a payment for this order."},
                 status=status.HTTP_403_FORBIDDEN
@@ -319,24 +414,40 @@ class ConfirmPaymentView(generics.GenericAPIView):
         payment_intent_id = serializer.validated_data['payment_intent_id']
         payment_method = serializer.validated_data['payment_method']
         
-        # Get the order and verify it exists
-        order = get_object_or_404(Order, id=order_id)
-        
-        # Here you would verify the payment with your payment processor
-        # For this example, we'll simulate a successful payment
-        
-        # Create the payment record
-        payment = Payment.objects.create(
-            order=order,
-            amount=order.total,
-            payment_method=payment_method,
-            transaction_id=payment_intent_id,
-            status='COMPLETED'
-        )
+        # Retries and webhook redeliveries are answered from the stored payment
+        payment = Payment.objects.filter(transaction_id=payment_intent_id).first()
+        if payment is None:
+            with transaction.atomic():
+                # Lock the order so concurrent confirmations are serialized
+                order = get_object_or_404(Order.objects.select_for_update(), id=order_id)
+                
+                # Here you would verify the payment with your payment processor
+                # For this example, we'll simulate a successful payment
+                
+                payment = Payment.objects.filter(transaction_id=payment_intent_id).first()
+                if payment is None:
+                    try:
+                        with transaction.atomic():
+                            payment = Payment.objects.create(
+                                order=order,
+                                amount=order.total,
+                                payment_method=payment_method,
+                                transaction_id=payment_intent_id,
+                                status='COMPLETED'
+                            )
+                    except IntegrityError:
+                        # Confirmed concurrently against another order
+                        payment = Payment.objects.get(transaction_id=payment_intent_id)
+                    else:
+                        # Update the order status
+                        order.status = 'PROCESSING'
+                        order.save(update_fields=['status', 'updated_at'])
         
-        # Update the order status
-        order.status = 'PROCESSING'
-        order.save()
+        if payment.order_id != order_id:
+            return Response(
+                {"detail": "This transaction has already been used for a different order."},
+                status=status.HTTP_409_CONFLICT
+            )
         
         return Response({
             "success": True,
@@ -344,16 +455,16 @@ class ConfirmPaymentView(generics.GenericAPIView):
         })
 
 # Search View
-class SearchView(generics.ListAPIView):
-    serializer_class = ProductSerializer
+class SearchView(SparseFieldsetMixin, ValuesListMixin, generics.ListAPIView):
+    serializer_class = ProductListSerializer
     permission_classes = [AllowAny]
-    filter_backends = [filters.SearchFilter, DjangoFilterBackend, filters.OrderingFilter]
-    search_fields = ['name', 'description', 'ingredients', 'category__name']
+    filter_backends = [ProductSearchFilter, DjangoFilterBackend, filters.OrderingFilter]
+    search_fields = ['name', 'description', 'ingredients', 'category__name']  # Used by the non-PostgreSQL fallback
     filterset_fields = ['category__slug']
     ordering_fields = ['name', 'price', 'created_at']
     
     def get_queryset(self):
-        queryset = Product.objects.filter(available=True)
+        queryset = Product.objects.for_listing().filter(available=True)
         
         # Additional filtering
         min_price = self.request.query_params.get('min_price')
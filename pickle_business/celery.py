@@ -0,0 +1,15 @@
+"""
+Celery config for pickle_business project.
+
+It exposes the Celery app as a module-level variable named ``app``; tasks are
+discovered from each installed app's ``tasks`` module.
+"""
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pickle_business.settings')
+
+app = Celery('pickle_business')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -1,9 +1,12 @@
 # pickle_business/settings.py
 import os
+import sys
+import tempfile
 from pathlib import Path
 from datetime import timedelta
 import dj_database_url
 import environ
+from celery.schedules import crontab
 
 # Environment setup
 env = environ.Env()
@@ -16,6 +19,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = os.environ.get('SECRET_KEY', 'django-insecure-4#v#@9l=%rrbgc-ac@e^=611-x_b+k-&zb$i21ng2b-&&+z3uw')
 ALLOWED_HOSTS = ['.vercel.app', 'localhost', '127.0.0.1']  # Replace wildcard with specific hosts
 DEBUG = False  # Ensure DEBUG is False in production
+TESTING = sys.argv[1:2] == ['test']
 # Application definition
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -24,6 +28,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',  # Search and trigram lookups in pickle_app.search
     
     # Third-party apps
     'rest_framework',
@@ -32,6 +37,8 @@ INSTALLED_APPS = [
     'corsheaders',
     'cloudinary',
     'cloudinary_storage',
+    'django_celery_results',
+    'django_celery_beat',
     
     # Local apps
     'pickle_app',  # Your app name
@@ -84,11 +91,21 @@ TEMPLATES = [
 # REST Framework and JWT settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'pickle_app.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # orjson-backed when it is installed, the stdlib json module otherwise
+    'DEFAULT_RENDERER_CLASSES': (
+        'pickle_app.fastjson.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'pickle_app.fastjson.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
 }
@@ -120,6 +137,9 @@ SIMPLE_JWT = {
 
     'JTI_CLAIM': 'jti',
 
+    'TOKEN_OBTAIN_SERIALIZER': 'pickle_app.serializers.ClaimsTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'pickle_app.serializers.ClaimsTokenRefreshSerializer',
+
     'SLIDING_TOKEN_REFRESH_EXP_CLAIM': 'refresh_exp',
     'SLIDING_TOKEN_LIFETIME': timedelta(hours=1),
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=14),
@@ -148,6 +168,44 @@ else:
 #         'NAME': 'db.sqlite3',
 #     }
 # }
+# Cache settings (the broker gets its own Redis via CELERY_BROKER_URL, see render.yaml)
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Celery settings
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', REDIS_URL)
+CELERY_RESULT_BACKEND = 'django-db'
+CELERY_TASK_ALWAYS_EAGER = TESTING  # Run tasks inline in the test suite only; deployments need a broker
+CELERY_TASK_EAGER_PROPAGATES = True
+CELERY_TASK_ACKS_LATE = True
+CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+CELERY_BEAT_SCHEDULE = {
+    'update-sales-rollups': {
+        'task': 'pickle_app.tasks.update_sales_rollups',
+        'schedule': 15 * 60,
+    },
+    'sweep-expired-stock': {
+        'task': 'pickle_app.tasks.sweep_expired_stock',
+        'schedule': crontab(hour=0, minute=5),
+    },
+}
+
+# Email settings
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'orders@picklebusiness.com')
+
 # Custom user model
 AUTH_USER_MODEL = 'pickle_app.User'
 
@@ -170,6 +228,7 @@ AUTH_PASSWORD_VALIDATORS = [
 # Internationalization
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
+CELERY_TIMEZONE = TIME_ZONE
 USE_I18N = True
 USE_TZ = True
 
@@ -181,6 +240,10 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 # Media files
 MEDIA_URL = '/media/'
 DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
+if TESTING:
+    # Uploads and image renditions go to a local directory instead of Cloudinary
+    DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
+    MEDIA_ROOT = Path(tempfile.gettempdir()) / 'pickle_test_media'
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file